@@ -0,0 +1,326 @@
+import argparse
+import importlib
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import numpy as np
+import pandas as pd
+import xarray as xr
+import regridder
+import wind_kernels
+
+# Section 1: Benchmark Settings
+
+benchmark_format_version = 1  # Bump when the layout of the JSON results changes.
+default_grid = (130, 160)  # Latitude x longitude cells of the synthetic climate grid.
+default_cities = 50  # Number of synthetic cities in the demand projection.
+default_extent = (49.0, 61.0, -11.0, 2.0)  # Latitude and longitude bounds of the synthetic grid.
+mask_refinement = 2  # The masks are written on a finer, wider grid so they go through regridding.
+regression_threshold = 0.10  # Relative slowdown reported as a regression by compare_results.
+
+# Section 2: Synthetic Inputs
+
+def write_synthetic_inputs(wind_pipeline, scenario, years, n_lat, n_lon, n_cities, seed=0):
+    """
+    Write synthetic NetCDF and CSV inputs at the paths the pipeline reads from.
+
+    Parameters:
+    - wind_pipeline: The wind_pipeline module, imported with the benchmark base directory.
+    - scenario: The RCP scenario label to generate climate data for.
+    - years: List of years to generate climate data and demand projections for.
+    - n_lat, n_lon: Size of the climate grid.
+    - n_cities: Number of cities in the demand projections.
+    - seed: Random seed, so every run benchmarks identical data.
+
+    The files hold the variables of the real inputs: the hurs, ps, sfcWind and tas
+    yearly averages, orography, land area, the land use classes with friction
+    coefficients, and the NSA, SPA and airport masks.
+    """
+    rng = np.random.default_rng(seed)
+    lat_min, lat_max, lon_min, lon_max = default_extent
+    lat = np.linspace(lat_min, lat_max, n_lat)
+    lon = np.linspace(lon_min, lon_max, n_lon)
+    coords = {'lat': lat, 'lon': lon}
+    shape = (n_lat, n_lon)
+
+    def write(ds, file_path):
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        ds.to_netcdf(file_path)
+
+    # Static layers on the climate grid
+    write(xr.Dataset({'orog': (('lat', 'lon'), rng.uniform(0, 1200, shape).astype(np.float32))}, coords=coords),
+          wind_pipeline.orography_file_path)
+    write(xr.Dataset({'sftlf': (('lat', 'lon'), rng.uniform(0, 100, shape).astype(np.float32))}, coords=coords),
+          wind_pipeline.land_area_file_path)
+
+    lccs_class = rng.integers(1, 8, size=(1,) + shape).astype(np.int8)
+    friction = np.array([0.0002, 0.15, 0.0002, 0.15, 0.2, 1.0, 0.2, 0.1])[lccs_class]
+    zeros = np.zeros_like(lccs_class)
+    write(xr.Dataset(
+        {
+            'lccs_class': (('time', 'lat', 'lon'), lccs_class),
+            'friction_coefficient': (('time', 'lat', 'lon'), friction),
+            'change_count': (('time', 'lat', 'lon'), zeros),
+            'observation_count': (('time', 'lat', 'lon'), zeros),
+            'processed_flag': (('time', 'lat', 'lon'), zeros),
+            'current_pixel_state': (('time', 'lat', 'lon'), zeros),
+            'time_bnds': (('time', 'bnds'), np.array([['2015-01-01', '2015-12-31']], dtype='datetime64[ns]')),
+        },
+        coords={'time': np.array(['2015-01-01'], dtype='datetime64[ns]'), **coords},
+    ), wind_pipeline.land_use_file_path)
+
+    # Masks on a finer grid covering a wider area, as the rasterised shapefiles are
+    step_lat = (lat_max - lat_min) / max(n_lat - 1, 1) / mask_refinement
+    step_lon = (lon_max - lon_min) / max(n_lon - 1, 1) / mask_refinement
+    mask_lat = np.arange(lat_min - 2, lat_max + 2, step_lat)
+    mask_lon = np.arange(lon_min - 2, lon_max + 2, step_lon)
+    mask_shape = (mask_lat.size, mask_lon.size)
+    for file_path in (wind_pipeline.nsa_mask_file_path, wind_pipeline.spa_mask_file_path):
+        mask = (rng.random(mask_shape) < 0.05).astype(np.uint8)
+        write(xr.Dataset({'mask': (('lat', 'lon'), mask)}, coords={'lat': mask_lat, 'lon': mask_lon}), file_path)
+    airport = (rng.random(mask_shape) < 0.01).astype(np.uint8)
+    write(xr.Dataset({
+        'airport': (('lat', 'lon'), airport),
+        'latitude': ('lat', mask_lat),
+        'longitude': ('lon', mask_lon),
+    }), wind_pipeline.airport_mask_file_path)
+
+    # Yearly mean climate and city demand projections
+    directories = wind_pipeline.scenario_directories(scenario)
+    climate = {
+        'hurs': lambda: rng.uniform(60, 95, shape),
+        'ps': lambda: rng.uniform(95000, 103000, shape),
+        'sfcWind': lambda: rng.weibull(2.0, shape) * 6,
+        'tas': lambda: rng.uniform(275, 290, shape),
+    }
+    city_lat = rng.uniform(lat_min, lat_max, n_cities)
+    city_lon = rng.uniform(lon_min, lon_max, n_cities)
+    population = rng.uniform(5e4, 5e6, n_cities)
+    for year in years:
+        for variable, values in climate.items():
+            write(xr.Dataset({variable: (('lat', 'lon'), values().astype(np.float32))}, coords=coords),
+                  os.path.join(directories['last_year_avg'], f"{variable}_{year}_yearly_avg.nc"))
+        pd.DataFrame({
+            'City': [f'City {index}' for index in range(n_cities)],
+            'Latitude': city_lat,
+            'Longitude': city_lon,
+            'Year': int(year),
+            'Projected Population': population,
+            'Energy Demand (kWh)': population * 5000,
+        }).to_csv(os.path.join(wind_pipeline.population_directory, f'city_power_demand_projection_{year}.csv'), index=False)
+
+# Section 3: Timing Stages
+
+class StageTimer:
+    """
+    Record the wall time and the peak traced memory of named stages.
+    """
+
+    def __init__(self):
+        self.stages = {}
+
+    def run(self, name, function, *args):
+        """
+        Run one stage and record its duration and peak memory.
+
+        Parameters:
+        - name: Stage name used in the results.
+        - function: Callable running the stage.
+        - args: Positional arguments passed to the callable.
+
+        Returns:
+        - The return value of the callable.
+        """
+        tracemalloc.reset_peak()
+        start_memory = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        result = function(*args)
+        seconds = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1] - start_memory
+        stage = self.stages.setdefault(name, {'seconds': [], 'peak_bytes': []})
+        stage['seconds'].append(seconds)
+        stage['peak_bytes'].append(max(peak, 0))
+        return result
+
+    def summary(self):
+        """
+        Summarise every stage over its repeats.
+
+        Returns:
+        - Dictionary mapping each stage to its best and median time and largest peak memory.
+        """
+        return {
+            name: {
+                'best_seconds': min(stage['seconds']),
+                'median_seconds': float(np.median(stage['seconds'])),
+                'seconds': stage['seconds'],
+                'peak_bytes': max(stage['peak_bytes']),
+            }
+            for name, stage in self.stages.items()
+        }
+
+def git_revision():
+    """
+    Return the current git commit of the code, or None outside a git checkout.
+    """
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=os.path.dirname(os.path.abspath(__file__)),
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+# Section 4: Running the Benchmark
+
+def run_benchmark(n_lat=default_grid[0], n_lon=default_grid[1], n_cities=default_cities, n_years=1, repeats=3,
+                  memory_limit=None, base_directory=None, seed=0):
+    """
+    Benchmark every pipeline stage on synthetic inputs.
+
+    Parameters:
+    - n_lat, n_lon: Size of the synthetic climate grid.
+    - n_cities: Number of synthetic cities.
+    - n_years: Number of years processed per repeat.
+    - repeats: Number of times every stage is run; the best and median times are reported.
+    - memory_limit: Working memory ceiling in bytes to benchmark chunked mode, or None for in-memory mode.
+    - base_directory: Directory for the synthetic inputs and outputs, a temporary directory by default.
+    - seed: Random seed of the synthetic inputs.
+
+    Returns:
+    - Dictionary of results, ready to be written as JSON.
+
+    The fused wind physics kernel is first checked against the reference functions
+    (wind_kernels.check_kernel), so a run fails before timing a kernel that is wrong.
+    """
+    if base_directory is None:
+        base_directory = tempfile.mkdtemp(prefix='windsight_benchmark_')
+    os.environ['WINDSIGHT_BASE_DIRECTORY'] = base_directory
+    wind_pipeline = importlib.import_module('wind_pipeline')
+    if wind_pipeline.base_directory != base_directory:
+        wind_pipeline = importlib.reload(wind_pipeline)
+
+    scenario = 'benchmark'
+    years = [str(2020 + index) for index in range(n_years)]
+    write_synthetic_inputs(wind_pipeline, scenario, years, n_lat, n_lon, n_cities, seed)
+    directories = wind_pipeline.scenario_directories(scenario)
+    chunks = wind_pipeline.spatial_chunks(memory_limit) if memory_limit else None
+
+    # Timings of a kernel that has drifted from the reference functions are meaningless
+    kernel_errors = wind_kernels.check_kernel()
+
+    tracemalloc.start()
+    timer = StageTimer()
+    try:
+        for _ in range(repeats):
+            # Start every repeat from cold static layer and regridding caches
+            wind_pipeline._static_layers.clear()
+            regridder._regridders.clear()
+            shutil.rmtree(wind_pipeline.regrid_directory, ignore_errors=True)
+            for file_path in (wind_pipeline.exclusion_mask_file_path,
+                              os.path.join(wind_pipeline.static_cache_directory, 'manifest.json')):
+                if os.path.exists(file_path):
+                    os.remove(file_path)
+            timer.run('static_layers', wind_pipeline.load_static_layers)
+
+            # In chunked mode the merge is lazy and its cost is measured when the final file is written
+            for year in years:
+                merged_ds = timer.run('merge', lambda: wind_pipeline.build_merged_dataset(scenario, year, chunks))
+                ds = timer.run('select_essential', wind_pipeline.select_essential_variables, merged_ds)
+                ds = timer.run('fill_missing', wind_pipeline.fill_missing_values, ds)
+                final_file_path = os.path.join(directories['final_files'], f"final_file_{year}.nc")
+                timer.run('write_final', wind_pipeline.write_netcdf, ds, final_file_path)
+                top_locations, top_locations_no_demand = timer.run('analysis', wind_pipeline.rank_locations, scenario, year)
+            timer.run('save_results', wind_pipeline.save_scenario_results, scenario, top_locations, top_locations_no_demand)
+    finally:
+        tracemalloc.stop()
+
+    stages = timer.summary()
+    return {
+        'format_version': benchmark_format_version,
+        'git_revision': git_revision(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'environment': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'numpy': np.__version__,
+            'xarray': xr.__version__,
+            'pandas': pd.__version__,
+        },
+        'config': {
+            'n_lat': n_lat, 'n_lon': n_lon, 'n_cities': n_cities, 'n_years': n_years,
+            'repeats': repeats, 'memory_limit': memory_limit, 'seed': seed,
+        },
+        'stages': stages,
+        'kernel_errors': {'/'.join(key): error for key, error in kernel_errors.items()},
+        'cells_per_second': {
+            name: n_lat * n_lon / stage['best_seconds'] for name, stage in stages.items() if stage['best_seconds'] > 0
+        },
+        'max_rss_bytes': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * (1 if sys.platform == 'darwin' else 1024),
+    }
+
+def compare_results(baseline, current, threshold=regression_threshold):
+    """
+    Compare two benchmark results stage by stage.
+
+    Parameters:
+    - baseline, current: Result dictionaries (or JSON file paths) from run_benchmark.
+    - threshold: Relative slowdown of the best time reported as a regression.
+
+    Returns:
+    - List of (stage, baseline seconds, current seconds, relative change) for the regressed stages.
+    """
+    results = []
+    for result in (baseline, current):
+        if isinstance(result, str):
+            with open(result) as f:
+                result = json.load(f)
+        results.append(result)
+    baseline, current = results
+    if baseline['config'] != current['config']:
+        print("Warning: the benchmark configurations differ, timings are not directly comparable")
+
+    regressions = []
+    for name, stage in current['stages'].items():
+        if name not in baseline['stages']:
+            continue
+        before, after = baseline['stages'][name]['best_seconds'], stage['best_seconds']
+        change = (after - before) / before if before else 0.0
+        print(f"{name:>16}: {before:9.4f} s -> {after:9.4f} s ({change:+.1%})")
+        if change > threshold:
+            regressions.append((name, before, after, change))
+    return regressions
+
+# Section 5: Command Line Entry Point
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the WindSight pipeline stages on synthetic inputs.')
+    parser.add_argument('--grid', type=int, nargs=2, default=default_grid, metavar=('N_LAT', 'N_LON'), help='Size of the synthetic grid.')
+    parser.add_argument('--cities', type=int, default=default_cities, help='Number of synthetic cities.')
+    parser.add_argument('--years', type=int, default=1, help='Number of years processed per repeat.')
+    parser.add_argument('--repeats', type=int, default=3, help='Number of repeats of every stage.')
+    parser.add_argument('--memory-limit', type=float, default=None, help='Benchmark chunked mode with this memory ceiling (in GB).')
+    parser.add_argument('--base-directory', default=None, help='Directory for the synthetic data, a temporary directory by default.')
+    parser.add_argument('--output', default='benchmark_results.json', help='JSON file the results are written to.')
+    parser.add_argument('--compare', default=None, help='Earlier JSON results to compare against.')
+    args = parser.parse_args()
+
+    memory_limit = int(args.memory_limit * 1024**3) if args.memory_limit else None
+    results = run_benchmark(args.grid[0], args.grid[1], args.cities, args.years, args.repeats, memory_limit, args.base_directory)
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"Benchmark results saved to {args.output}")
+    for name, stage in results['stages'].items():
+        print(f"{name:>16}: best {stage['best_seconds']:.4f} s, peak {stage['peak_bytes'] / 1024**2:.1f} MB")
+
+    if args.compare:
+        regressions = compare_results(args.compare, results)
+        if regressions:
+            print(f"{len(regressions)} stage(s) slower than the baseline by more than {regression_threshold:.0%}")
+            sys.exit(1)
@@ -0,0 +1,92 @@
+import hashlib
+import json
+import os
+
+# Section 1: Content Hashes
+
+# Digests already computed in this process, keyed by (path, size, mtime) so that a
+# file shared by many stages is only read once per run.
+_file_digests = {}
+hash_block_size = 1024 * 1024
+
+def file_digest(file_path):
+    """
+    Compute the SHA-256 digest of a file's contents.
+
+    Parameters:
+    - file_path: Path of the file.
+
+    Returns:
+    - Hexadecimal digest, or None if the file does not exist.
+    """
+    if not os.path.exists(file_path):
+        return None
+    stat = os.stat(file_path)
+    key = (os.path.abspath(file_path), stat.st_size, stat.st_mtime_ns)
+    if key not in _file_digests:
+        digest = hashlib.sha256()
+        with open(file_path, 'rb') as f:
+            for block in iter(lambda: f.read(hash_block_size), b''):
+                digest.update(block)
+        _file_digests[key] = digest.hexdigest()
+    return _file_digests[key]
+
+def stage_signature(inputs, parameters):
+    """
+    Combine the input file digests and the parameters of a stage into one signature.
+
+    Parameters:
+    - inputs: Dictionary mapping input names to file paths.
+    - parameters: JSON-serialisable dictionary of the parameters the stage depends on.
+
+    Returns:
+    - Tuple (signature, details) where signature is a hexadecimal digest and details
+      is the dictionary it was computed from.
+    """
+    details = {
+        'inputs': {name: file_digest(path) for name, path in sorted(inputs.items())},
+        'parameters': parameters,
+    }
+    signature = hashlib.sha256(json.dumps(details, sort_keys=True, default=str).encode()).hexdigest()
+    return signature, details
+
+# Section 2: Stage Stamps
+
+def stamp_path(output_path):
+    """
+    Return the path of the stamp file recorded next to a stage output.
+    """
+    return output_path + '.stamp.json'
+
+def is_up_to_date(output_path, signature):
+    """
+    Check whether a stage output was built from the current inputs and parameters.
+
+    Parameters:
+    - output_path: Path of the stage output.
+    - signature: Current signature of the stage (see stage_signature).
+
+    Returns:
+    - True if the output exists and its stamp records the same signature.
+    """
+    if not (os.path.exists(output_path) and os.path.exists(stamp_path(output_path))):
+        return False
+    try:
+        with open(stamp_path(output_path)) as f:
+            return json.load(f).get('signature') == signature
+    except (OSError, ValueError):
+        return False
+
+def record_stamp(output_path, signature, details):
+    """
+    Record the signature of a freshly built stage output.
+
+    Parameters:
+    - output_path: Path of the stage output.
+    - signature: Signature of the stage.
+    - details: Input digests and parameters the signature was computed from.
+    """
+    temporary_path = stamp_path(output_path) + '.tmp'
+    with open(temporary_path, 'w') as f:
+        json.dump({'signature': signature, **details}, f, indent=2, sort_keys=True, default=str)
+    os.replace(temporary_path, stamp_path(output_path))
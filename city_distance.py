@@ -0,0 +1,89 @@
+import numpy as np
+
+# Section 1: Constants
+
+# Mean Earth radius in kilometres, the same value geopy's great_circle uses.
+earth_radius_km = 6371.009
+
+# Upper bound on the working memory of a single distance block (in bytes).
+# Each block holds a handful of float64 temporaries of shape (city, lat rows, lon).
+default_max_block_bytes = 256 * 1024 * 1024
+temporaries_per_block = 6
+
+# Section 2: Vectorised Great-Circle Distances
+
+def haversine_distance(lat1, lon1, lat2, lon2):
+    """
+    Calculate great-circle distances with the haversine formula.
+
+    Parameters:
+    - lat1, lon1: Latitude and longitude of the first point(s) in degrees.
+    - lat2, lon2: Latitude and longitude of the second point(s) in degrees.
+
+    All inputs are broadcast against each other, so any mix of scalars and arrays works.
+
+    Returns:
+    - Distance in kilometres with the broadcast shape of the inputs.
+    """
+    phi1 = np.radians(lat1)
+    phi2 = np.radians(lat2)
+    return haversine_radians(phi1, np.radians(lon1), np.cos(phi1), phi2, np.radians(lon2), np.cos(phi2))
+
+def haversine_radians(phi1, lambda1, cos_phi1, phi2, lambda2, cos_phi2):
+    """
+    Calculate great-circle distances from coordinates already converted to radians.
+
+    Parameters:
+    - phi1, lambda1, cos_phi1: Latitude, longitude and cosine of the latitude of the first point(s).
+    - phi2, lambda2, cos_phi2: The same for the second point(s).
+
+    Returns:
+    - Distance in kilometres, identical to haversine_distance on the degree coordinates.
+
+    Callers that query the same points repeatedly can convert them once.
+    """
+    sin_dphi = np.sin((phi2 - phi1) * 0.5)
+    sin_dlam = np.sin((lambda2 - lambda1) * 0.5)
+    a = sin_dphi ** 2 + cos_phi1 * cos_phi2 * sin_dlam ** 2
+    return 2 * earth_radius_km * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+def city_distance_cube(city_lats, city_lons, lat, lon, max_block_bytes=default_max_block_bytes, out=None):
+    """
+    Calculate the distance from every city to every grid cell.
+
+    Parameters:
+    - city_lats, city_lons: 1D sequences of city coordinates in degrees.
+    - lat, lon: 1D grid coordinates in degrees.
+    - max_block_bytes: Working memory allowed for one block of latitude rows.
+    - out: Optional preallocated float array of shape (city, lat, lon) to fill.
+
+    Returns:
+    - Array of shape (city, lat, lon) with distances in kilometres.
+
+    The cube is filled one block of latitude rows at a time so that the haversine
+    temporaries never exceed max_block_bytes, whatever the size of the grid.
+    """
+    city_lats = np.asarray(city_lats, dtype=np.float64)
+    city_lons = np.asarray(city_lons, dtype=np.float64)
+    lat = np.asarray(lat, dtype=np.float64)
+    lon = np.asarray(lon, dtype=np.float64)
+
+    shape = (city_lats.size, lat.size, lon.size)
+    if out is None:
+        out = np.empty(shape, dtype=np.float64)
+    elif out.shape != shape:
+        raise ValueError(f"Output array has shape {out.shape}, expected {shape}")
+
+    row_bytes = max(city_lats.size * lon.size * 8 * temporaries_per_block, 1)
+    rows_per_block = max(1, int(max_block_bytes // row_bytes))
+
+    city_lat_column = city_lats[:, None, None]
+    city_lon_column = city_lons[:, None, None]
+    lon_row = lon[None, None, :]
+    for start in range(0, lat.size, rows_per_block):
+        stop = min(start + rows_per_block, lat.size)
+        out[:, start:stop, :] = haversine_distance(
+            city_lat_column, city_lon_column, lat[None, start:stop, None], lon_row
+        )
+
+    return out
@@ -0,0 +1,120 @@
+import json
+import os
+import numpy as np
+import xarray as xr
+from static_layers import align_static_layers, source_signature
+
+# Section 1: Exclusion Reasons
+
+# Each exclusion reason owns one bit of the packed uint8 mask.
+exclusion_nsa = 1  # National Scenic Area.
+exclusion_spa = 2  # Special Protection Area.
+exclusion_airport = 4  # Airport grid cell.
+exclusion_urban = 8  # Urban land use (lccs_class 5).
+exclusion_water = 16  # Water land use (lccs_class 2).
+
+exclusion_reasons = {
+    exclusion_nsa: 'nsa',
+    exclusion_spa: 'spa',
+    exclusion_airport: 'airport',
+    exclusion_urban: 'urban',
+    exclusion_water: 'water',
+}
+
+# Land use classes excluded from wind farm development.
+urban_class = 5
+water_class = 2
+
+# Section 2: Building the Bitmask
+
+def build_exclusion_mask(land_use_ds, nsa_mask, spa_mask, airport_mask):
+    """
+    Fuse every exclusion layer into one packed uint8 bitmask.
+
+    Parameters:
+    - land_use_ds: Land use dataset holding 'lccs_class' on the climate grid.
+    - nsa_mask, spa_mask, airport_mask: Mask DataArrays aligned to the climate grid (non-zero = excluded).
+
+    Returns:
+    - DataArray 'exclusion' on (lat, lon); 0 means the cell is available, otherwise
+      each set bit records one reason for excluding it.
+    """
+    lccs_class = land_use_ds['lccs_class']
+    extra_dims = [dim for dim in lccs_class.dims if dim not in ('lat', 'lon')]
+    urban = (lccs_class == urban_class).any(extra_dims)
+    water = (lccs_class == water_class).any(extra_dims)
+
+    bits = np.zeros((nsa_mask.sizes['lat'], nsa_mask.sizes['lon']), dtype=np.uint8)
+    for flag, layer in ((exclusion_nsa, nsa_mask), (exclusion_spa, spa_mask), (exclusion_airport, airport_mask),
+                        (exclusion_urban, urban), (exclusion_water, water)):
+        bits |= np.where(layer.transpose('lat', 'lon').values != 0, flag, 0).astype(np.uint8)
+
+    return xr.DataArray(
+        bits,
+        dims=('lat', 'lon'),
+        coords={'lat': nsa_mask['lat'].values, 'lon': nsa_mask['lon'].values},
+        name='exclusion',
+        attrs={
+            'long_name': 'Reasons for excluding the grid cell from wind farm development',
+            'flag_masks': np.array(list(exclusion_reasons), dtype=np.uint8),
+            'flag_meanings': ' '.join(exclusion_reasons.values()),
+        },
+    )
+
+def describe_exclusion(bits):
+    """
+    List the exclusion reasons encoded in a bitmask value.
+
+    Parameters:
+    - bits: Integer value of the exclusion bitmask for one cell.
+
+    Returns:
+    - List of reason names, empty if the cell is available.
+    """
+    return [reason for flag, reason in exclusion_reasons.items() if int(bits) & flag]
+
+# Section 3: Preprocessing Stage
+
+def prepare_exclusion_mask(file_path, file_paths, mask_variables, grid_layer='orography', regrid_directory=None, method='nearest'):
+    """
+    Write the exclusion bitmask file unless an up-to-date copy already exists.
+
+    Parameters:
+    - file_path: Output path of the exclusion bitmask NetCDF file.
+    - file_paths: Dictionary mapping layer names ('orography', 'land_use' and the masks) to NetCDF paths.
+    - mask_variables: Dictionary mapping the 'nsa_mask', 'spa_mask' and 'airport_mask' layers to their variable name.
+    - grid_layer: Name of the layer that defines the climate grid.
+    - regrid_directory: Directory where the regridding indices are persisted.
+    - method: Regridding method used to align the binary masks, 'nearest' or 'area'. The
+              land use classes are always aligned with 'nearest'.
+
+    Returns:
+    - The file path of the exclusion bitmask.
+    """
+    used_layers = {grid_layer, 'land_use', *mask_variables}
+    used_paths = {name: path for name, path in file_paths.items() if name in used_layers}
+    sources = {name: source_signature(path) for name, path in used_paths.items()}
+    sources['method'] = {'masks': method, 'land_use': 'nearest'}
+    sources = json.dumps(sources, sort_keys=True)
+
+    if os.path.exists(file_path):
+        with xr.open_dataset(file_path) as ds:
+            if ds.attrs.get('sources') == sources:
+                return file_path
+
+    layers = align_static_layers(used_paths, mask_variables, grid_layer, regrid_directory, method)
+    exclusion = build_exclusion_mask(
+        layers['land_use'],
+        layers['nsa_mask'][mask_variables['nsa_mask']],
+        layers['spa_mask'][mask_variables['spa_mask']],
+        layers['airport_mask'][mask_variables['airport_mask']],
+    )
+    xr.Dataset({'exclusion': exclusion}, attrs={'sources': sources}).to_netcdf(file_path)
+    print(f"Exclusion bitmask saved at {file_path}")
+
+    return file_path
+
+if __name__ == '__main__':
+    import wind_pipeline
+    prepare_exclusion_mask(wind_pipeline.exclusion_mask_file_path, wind_pipeline.static_layer_file_paths, wind_pipeline.mask_variables,
+                           regrid_directory=wind_pipeline.regrid_directory, method=wind_pipeline.mask_regrid_method)
@@ -0,0 +1,153 @@
+import hashlib
+import json
+import os
+import numpy as np
+from city_distance import city_distance_cube
+
+# Section 1: Cache Keys
+
+def geometry_key(city_lats, city_lons, lat, lon, loss_parameters):
+    """
+    Hash a city list, a grid and the loss parameters into a short cache key.
+
+    Parameters:
+    - city_lats, city_lons: City coordinates in degrees.
+    - lat, lon: 1D grid coordinates in degrees.
+    - loss_parameters: JSON-serialisable dictionary of the parameters of the loss factor.
+
+    Returns:
+    - Hexadecimal digest identifying the geometry. Any change to a city position, the
+      number or order of the cities, the grid or the loss parameters gives a new key.
+    """
+    digest = hashlib.sha1(json.dumps(loss_parameters, sort_keys=True).encode())
+    for coords in (city_lats, city_lons, lat, lon):
+        coords = np.ascontiguousarray(coords, dtype=np.float64)
+        digest.update(str(coords.size).encode())
+        digest.update(coords.tobytes())
+    return digest.hexdigest()[:16]
+
+# Section 2: Memory-Mapped City Geometry
+
+class CityGeometry:
+    """
+    Distances and transmission loss factors between every city and every grid cell.
+
+    Both cubes have shape (city, lat, lon) and are memory-mapped read-only, so every
+    scenario, year and worker process shares one copy in the page cache.
+    """
+
+    def __init__(self, distance, loss_factor):
+        """
+        Parameters:
+        - distance: Array of great-circle distances in km.
+        - loss_factor: Array of the fraction of power left after transmission.
+        """
+        self.distance = distance
+        self.loss_factor = loss_factor
+
+    @classmethod
+    def load(cls, file_stem):
+        return cls(np.load(f"{file_stem}.distance.npy", mmap_mode='r'), np.load(f"{file_stem}.loss_factor.npy", mmap_mode='r'))
+
+def write_geometry(file_stem, city_lats, city_lons, lat, lon, loss_factor):
+    """
+    Compute the distance and loss factor cubes and write them as .npy files.
+
+    Parameters:
+    - file_stem: Output path without the '.distance.npy' and '.loss_factor.npy' suffixes.
+    - city_lats, city_lons: City coordinates in degrees.
+    - lat, lon: 1D grid coordinates in degrees.
+    - loss_factor: Function mapping an array of distances to the fraction of power left.
+
+    Each cube is filled in place in a temporary file and moved into place when it is
+    complete, so a reader never maps a partially written cube.
+    """
+    shape = (len(city_lats), len(lat), len(lon))
+    temporary = f"{file_stem}.{os.getpid()}.tmp"
+    distance = np.lib.format.open_memmap(temporary + '.distance', mode='w+', dtype=np.float64, shape=shape)
+    city_distance_cube(city_lats, city_lons, lat, lon, out=distance)
+    factor = np.lib.format.open_memmap(temporary + '.loss_factor', mode='w+', dtype=np.float64, shape=shape)
+    for city_index in range(shape[0]):
+        factor[city_index] = loss_factor(distance[city_index])
+    distance.flush()
+    factor.flush()
+    # Close the maps before moving the files
+    del distance, factor
+    for name in ('distance', 'loss_factor'):
+        os.replace(f"{temporary}.{name}", f"{file_stem}.{name}.npy")
+
+# Number of geometries kept in the cache directory, most recently used first. Each
+# year can have its own city list, so this leaves room for every year of a run.
+geometry_cache_entries = 4
+
+def prune_geometries(cache_directory, keep=geometry_cache_entries):
+    """
+    Delete all but the most recently used geometries of a cache directory.
+
+    Parameters:
+    - cache_directory: Directory where the cubes are stored.
+    - keep: Number of geometries to keep.
+
+    Returns:
+    - List of the file stems that were removed.
+
+    Use is tracked through the modification time of the distance cube. Processes that
+    still map a removed cube keep reading it until they unmap it.
+    """
+    stems = []
+    for name in os.listdir(cache_directory):
+        if name.startswith('geometry_') and name.endswith('.distance.npy'):
+            stem = os.path.join(cache_directory, name[:-len('.distance.npy')])
+            try:
+                stems.append((os.path.getmtime(f"{stem}.distance.npy"), stem))
+            except FileNotFoundError:
+                continue
+    removed = []
+    for _, stem in sorted(stems, reverse=True)[keep:]:
+        for suffix in ('distance', 'loss_factor'):
+            try:
+                os.remove(f"{stem}.{suffix}.npy")
+            except FileNotFoundError:
+                pass
+        removed.append(stem)
+    return removed
+
+# Geometries already loaded in this process, keyed by geometry_key.
+_geometries = {}
+
+def cached_city_geometry(cache_directory, city_lats, city_lons, lat, lon, loss_factor, loss_parameters):
+    """
+    Return the city geometry of a grid, building and persisting it on first use.
+
+    Parameters:
+    - cache_directory: Directory where the cubes are stored.
+    - city_lats, city_lons: City coordinates in degrees.
+    - lat, lon: 1D grid coordinates in degrees.
+    - loss_factor: Function mapping an array of distances to the fraction of power left.
+    - loss_parameters: Dictionary of the parameters loss_factor depends on, part of the key.
+
+    Returns:
+    - CityGeometry instance.
+
+    Writing a new geometry prunes the directory to the geometry_cache_entries most
+    recently used ones, so cubes of old grids and city lists do not accumulate.
+    """
+    key = geometry_key(city_lats, city_lons, lat, lon, loss_parameters)
+    if key in _geometries:
+        return _geometries[key]
+
+    file_stem = os.path.join(cache_directory, f"geometry_{key}")
+    try:
+        geometry = CityGeometry.load(file_stem)
+        # Mark the geometry as recently used so pruning keeps it
+        os.utime(f"{file_stem}.distance.npy")
+    except FileNotFoundError:
+        os.makedirs(cache_directory, exist_ok=True)
+        write_geometry(file_stem, city_lats, city_lons, lat, lon, loss_factor)
+        print(f"City geometry of {len(city_lats)} cities saved at {file_stem}")
+        for removed in prune_geometries(cache_directory):
+            print(f"Removed the unused city geometry {removed}")
+        geometry = CityGeometry.load(file_stem)
+
+    _geometries[key] = geometry
+    return geometry
@@ -0,0 +1,194 @@
+import contextlib
+import json
+import os
+import resource
+import sys
+import time
+
+# Section 1: Configuration
+
+# The settings live in environment variables so that worker processes started by
+# run_scenarios inherit them, whether they are forked or spawned.
+metrics_environment_variable = 'WINDSIGHT_METRICS'
+trace_environment_variable = 'WINDSIGHT_TRACE'
+
+def configure(metrics_path=None, trace_path=None):
+    """
+    Enable or disable the stage instrumentation for this process and its workers.
+
+    Parameters:
+    - metrics_path: JSON lines file every stage record is appended to, or None. An
+                    existing file is emptied so it only holds the records of this run.
+    - trace_path: Chrome trace file written by write_chrome_trace, or None. Recording
+                  a trace also records metrics, next to the trace if no metrics path is given.
+
+    Calling configure() with no arguments disables the instrumentation.
+    """
+    if trace_path and not metrics_path:
+        metrics_path = trace_path + '.jsonl'
+    for variable, value in ((metrics_environment_variable, metrics_path), (trace_environment_variable, trace_path)):
+        if value:
+            os.environ[variable] = os.path.abspath(value)
+        else:
+            os.environ.pop(variable, None)
+    if metrics_path:
+        open(metrics_path, 'w').close()
+
+def metrics_path():
+    """
+    Return the JSON lines file of the stage records, or None when instrumentation is disabled.
+    """
+    return os.environ.get(metrics_environment_variable)
+
+# Section 2: Process Counters
+
+def _read_proc(file_name, fields):
+    """
+    Read integer fields from a /proc/self file, or return an empty dictionary off Linux.
+    """
+    values = {}
+    try:
+        with open(f'/proc/self/{file_name}') as f:
+            for line in f:
+                key, _, value = line.partition(':')
+                if key in fields:
+                    values[key] = int(value.split()[0])
+    except OSError:
+        pass
+    return values
+
+def peak_rss():
+    """
+    Return the peak resident set size of the process in bytes.
+    """
+    status = _read_proc('status', ('VmHWM',))
+    if 'VmHWM' in status:
+        return status['VmHWM'] * 1024
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * (1 if sys.platform == 'darwin' else 1024)
+
+def reset_peak_rss():
+    """
+    Reset the peak resident set size so the next reading covers one stage only (Linux only).
+    """
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except OSError:
+        pass
+
+def io_bytes():
+    """
+    Return the bytes read and written by the process so far, or (None, None) if unknown.
+    """
+    counters = _read_proc('io', ('rchar', 'wchar'))
+    return counters.get('rchar'), counters.get('wchar')
+
+# Section 3: Instrumented Stages
+
+# Records of the stages currently running in this process, innermost last.
+_open_stages = []
+
+@contextlib.contextmanager
+def _recorded_stage(name, labels, path):
+    record = {'stage': name, **labels, 'pid': os.getpid(), 'start': time.time(), 'peak_rss_bytes': 0}
+    read_start, write_start = io_bytes()
+    wall_start, cpu_start = time.perf_counter(), time.process_time()
+    if _open_stages:
+        _open_stages[-1]['peak_rss_bytes'] = max(_open_stages[-1]['peak_rss_bytes'], peak_rss())
+    reset_peak_rss()
+    _open_stages.append(record)
+    try:
+        yield record
+    finally:
+        _open_stages.pop()
+        read_end, write_end = io_bytes()
+        record['wall_seconds'] = time.perf_counter() - wall_start
+        record['cpu_seconds'] = time.process_time() - cpu_start
+        record['peak_rss_bytes'] = max(record['peak_rss_bytes'], peak_rss())
+        record['read_bytes'] = read_end - read_start if read_start is not None else None
+        record['write_bytes'] = write_end - write_start if write_start is not None else None
+
+        # A nested stage resets the peak, so hand its reading to the enclosing stage
+        if _open_stages:
+            _open_stages[-1]['peak_rss_bytes'] = max(_open_stages[-1]['peak_rss_bytes'], record['peak_rss_bytes'])
+
+        # One write per record keeps lines from different worker processes whole
+        with open(path, 'a') as f:
+            f.write(json.dumps(record, default=str) + '\n')
+
+def stage(name, **labels):
+    """
+    Measure one pipeline stage.
+
+    Parameters:
+    - name: Stage name, e.g. 'merge' or 'excel_export'.
+    - labels: Extra fields stored with the record, usually scenario and year.
+
+    Returns:
+    - Context manager. When instrumentation is enabled it appends a JSON line with the
+      wall time, CPU time, peak RSS and bytes read and written during the stage;
+      otherwise it is a shared no-op context, so disabled instrumentation only costs
+      one environment lookup per stage.
+
+    Example:
+        with stage('merge', scenario='2.6', year='2050'):
+            ...
+    """
+    path = metrics_path()
+    if path is None:
+        return _disabled_stage
+    return _recorded_stage(name, labels, path)
+
+_disabled_stage = contextlib.nullcontext()
+
+# Section 4: Chrome Trace Export
+
+def read_records(path=None):
+    """
+    Read the stage records of a JSON lines metrics file.
+
+    Parameters:
+    - path: Metrics file, by default the configured one.
+
+    Returns:
+    - List of record dictionaries in the order they were written.
+    """
+    path = path or metrics_path()
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def write_chrome_trace(trace_path=None, path=None):
+    """
+    Convert the stage records into a Chrome trace (chrome://tracing or Perfetto).
+
+    Parameters:
+    - trace_path: Output file, by default the configured trace path.
+    - path: Metrics file to convert, by default the configured one.
+
+    Returns:
+    - The trace file path, or None if no trace was requested.
+
+    Every stage becomes a complete event on the row of the process that ran it, with
+    the CPU time, memory and I/O figures attached as event arguments.
+    """
+    trace_path = trace_path or os.environ.get(trace_environment_variable)
+    if not trace_path:
+        return None
+    events = []
+    for record in read_records(path):
+        labels = [str(record[key]) for key in ('scenario', 'year') if key in record]
+        events.append({
+            'name': ' '.join([record['stage'], *labels]),
+            'cat': record['stage'],
+            'ph': 'X',
+            'ts': record['start'] * 1e6,
+            'dur': record['wall_seconds'] * 1e6,
+            'pid': record['pid'],
+            'tid': record['pid'],
+            'args': {key: value for key, value in record.items() if key not in ('stage', 'start', 'pid')},
+        })
+    with open(trace_path, 'w') as f:
+        json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f)
+    print(f"Chrome trace saved at {trace_path}")
+    return trace_path
@@ -0,0 +1,133 @@
+import argparse
+import os
+import numpy as np
+import xarray as xr
+import wind_pipeline
+
+# Section 1: Parameter Grids
+
+# Constants that can be swept, with their default value in the model.
+sweep_defaults = {
+    'turbine_area': wind_pipeline.turbine_area,
+    'power_coefficient': wind_pipeline.power_coefficient,
+    'reference_height': wind_pipeline.reference_height,
+    'target_height': wind_pipeline.target_height,
+    'capacity_factor': wind_pipeline.assumed_capacity_factor,
+}
+
+def parameter_grid(**values):
+    """
+    Build a full factorial sweep, one dimension per parameter.
+
+    Parameters:
+    - values: Parameter names mapped to a list of values, e.g. turbine_area=[1000, 2000].
+
+    Returns:
+    - Dictionary of DataArrays, each on its own dimension named after the parameter.
+      Parameters that are not given keep their model default.
+    """
+    parameters = dict(sweep_defaults)
+    for name, value in values.items():
+        if name not in sweep_defaults:
+            raise KeyError(f"Unknown sweep parameter '{name}', expected one of {list(sweep_defaults)}")
+        value = np.atleast_1d(value)
+        parameters[name] = xr.DataArray(value, dims=name, coords={name: value})
+    return parameters
+
+def parameter_points(dim='point', **values):
+    """
+    Build a sweep of paired values that share one dimension, e.g. sampled parameter sets.
+
+    Parameters:
+    - dim: Name of the shared dimension.
+    - values: Parameter names mapped to equal-length lists of values.
+
+    Returns:
+    - Dictionary of DataArrays on the shared dimension; missing parameters keep their default.
+    """
+    parameters = dict(sweep_defaults)
+    for name, value in values.items():
+        if name not in sweep_defaults:
+            raise KeyError(f"Unknown sweep parameter '{name}', expected one of {list(sweep_defaults)}")
+        parameters[name] = xr.DataArray(np.atleast_1d(value), dims=dim)
+    return parameters
+
+# Section 2: Evaluating a Sweep
+
+def evaluate_sweep(merged_ds, parameters):
+    """
+    Evaluate power and annual energy for every parameter combination at once.
+
+    Parameters:
+    - merged_ds: Merged dataset holding 'sfcWind', 'friction_coefficient', 'air_density' and 'exclusion'.
+    - parameters: Dictionary from parameter_grid or parameter_points.
+
+    Returns:
+    - Dataset with 'power_generation' (kW) and 'annual_energy' (kWh) on the parameter
+      dimensions followed by the grid dimensions.
+
+    The power formula separates into a grid term (ρ · v10³), a height term that only
+    depends on the two heights and the surface friction, and a scalar turbine term
+    (A · Cp). Each term is computed once and the parameter dimensions are combined by
+    broadcasting, so a sweep costs one evaluation of each term rather than one model
+    run per point.
+    """
+    friction = merged_ds['friction_coefficient']
+    available = merged_ds['exclusion'] == 0
+
+    grid_term = merged_ds['air_density'] * merged_ds['sfcWind'] ** 3
+    height_term = (np.log(parameters['target_height'] / friction) / np.log(parameters['reference_height'] / friction)) ** 3
+    turbine_term = 0.5 * parameters['turbine_area'] * parameters['power_coefficient'] / 1000
+
+    power = (turbine_term * (grid_term * height_term)).where(available, 0).fillna(0)
+    annual_energy = power * (parameters['capacity_factor'] * 24) * wind_pipeline.days_per_year
+
+    # Parameter dimensions first, then the grid in the order of the merged dataset
+    grid_dims = list(dict.fromkeys(merged_ds['sfcWind'].dims + friction.dims + merged_ds['air_density'].dims))
+    parameter_dims = [dim for dim in annual_energy.dims if dim not in grid_dims]
+    sweep = xr.Dataset({
+        'power_generation': power.transpose(*parameter_dims, *grid_dims, missing_dims='ignore').assign_attrs(units='kW'),
+        'annual_energy': annual_energy.transpose(*parameter_dims, *grid_dims).assign_attrs(units='kWh'),
+    })
+    for name, value in parameters.items():
+        if isinstance(value, xr.DataArray) and name not in sweep.coords:
+            sweep = sweep.assign_coords({name: value})
+        elif not isinstance(value, xr.DataArray):
+            sweep.attrs[name] = value
+    return sweep
+
+def run_sweep(scenario, year, parameters, output_path=None):
+    """
+    Merge the inputs of a scenario and year once and write the whole sweep to one NetCDF file.
+
+    Parameters:
+    - scenario: The RCP scenario label.
+    - year: The year to evaluate.
+    - parameters: Dictionary from parameter_grid or parameter_points.
+    - output_path: Output file, by default sweep_{year}.nc in the scenario's final_files directory.
+
+    Returns:
+    - The file path of the sweep cube.
+    """
+    if output_path is None:
+        output_path = os.path.join(wind_pipeline.scenario_directories(scenario)['final_files'], f"sweep_{year}.nc")
+    merged_ds = wind_pipeline.build_merged_dataset(scenario, year)
+    sweep = evaluate_sweep(merged_ds, parameters)
+    sweep.attrs.update(scenario=scenario, year=year)
+    sweep.to_netcdf(output_path)
+    print(f"Parameter sweep for RCP {scenario} {year} saved at {output_path}")
+    return output_path
+
+# Section 3: Command Line Entry Point
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Evaluate a grid of turbine and site constants over one scenario year.')
+    parser.add_argument('--scenario', default='2.6', help='RCP scenario to evaluate.')
+    parser.add_argument('--year', default='2050', help='Year to evaluate.')
+    parser.add_argument('--output', default=None, help='Output NetCDF file.')
+    for name in sweep_defaults:
+        parser.add_argument(f"--{name.replace('_', '-')}", type=float, nargs='+', default=None, help=f'Values of {name}.')
+    args = parser.parse_args()
+
+    values = {name: getattr(args, name) for name in sweep_defaults if getattr(args, name) is not None}
+    run_sweep(args.scenario, args.year, parameter_grid(**values), args.output)
@@ -0,0 +1,281 @@
+import hashlib
+import os
+import numpy as np
+import xarray as xr
+
+# Section 1: Per-Axis Index Mappings
+
+def nearest_indices(source, target):
+    """
+    Map every target coordinate to the index of the nearest source coordinate.
+
+    Parameters:
+    - source: 1D array of source coordinates (ascending or descending).
+    - target: 1D array of target coordinates.
+
+    Returns:
+    - Integer array with one source index per target coordinate.
+
+    Ties are resolved towards the larger coordinate, the same rule xarray's
+    reindex(method='nearest') follows, so the mapping reproduces it exactly.
+    """
+    source = np.asarray(source, dtype=np.float64)
+    target = np.asarray(target, dtype=np.float64)
+    order = np.argsort(source, kind='stable')
+    ordered = source[order]
+
+    right = np.searchsorted(ordered, target, side='left')
+    left = np.searchsorted(ordered, target, side='right') - 1
+    right_valid = right < ordered.size
+    left_valid = left >= 0
+
+    left_distance = np.where(left_valid, np.abs(target - ordered[np.clip(left, 0, None)]), np.inf)
+    right_distance = np.where(right_valid, np.abs(ordered[np.clip(right, None, ordered.size - 1)] - target), np.inf)
+    chosen = np.where(left_distance < right_distance, left, right)
+    return order[chosen]
+
+def cell_edges(centres):
+    """
+    Derive cell edges from cell centre coordinates.
+
+    Parameters:
+    - centres: 1D ascending array of cell centres.
+
+    Returns:
+    - 1D array of len(centres) + 1 edges.
+    """
+    centres = np.asarray(centres, dtype=np.float64)
+    if centres.size == 1:
+        return np.array([centres[0] - 0.5, centres[0] + 0.5])
+    midpoints = (centres[1:] + centres[:-1]) / 2
+    return np.concatenate([[2 * centres[0] - midpoints[0]], midpoints, [2 * centres[-1] - midpoints[-1]]])
+
+def overlap_weights(source, target, latitude=False):
+    """
+    Compute the overlap between source and target cells along one axis.
+
+    Parameters:
+    - source: 1D array of source cell centres.
+    - target: 1D array of target cell centres.
+    - latitude: Measure overlaps in sin(latitude) so the weights are proportional to area.
+
+    Returns:
+    - Tuple (target_index, source_index, weight) of equal-length arrays listing every overlapping pair.
+    """
+    source = np.asarray(source, dtype=np.float64)
+    target = np.asarray(target, dtype=np.float64)
+    source_order = np.argsort(source, kind='stable')
+    target_order = np.argsort(target, kind='stable')
+    source_edges = cell_edges(source[source_order])
+    target_edges = cell_edges(target[target_order])
+    if latitude:
+        source_edges = np.sin(np.radians(np.clip(source_edges, -90, 90)))
+        target_edges = np.sin(np.radians(np.clip(target_edges, -90, 90)))
+
+    # Each target cell overlaps a contiguous run of source cells
+    first = np.clip(np.searchsorted(source_edges, target_edges[:-1], side='right') - 1, 0, source.size - 1)
+    last = np.clip(np.searchsorted(source_edges, target_edges[1:], side='left') - 1, 0, source.size - 1)
+    counts = np.maximum(last - first + 1, 0)
+    target_index = np.repeat(np.arange(target.size), counts)
+    source_index = np.repeat(first, counts) + (np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts))
+
+    lower = np.maximum(source_edges[source_index], target_edges[target_index])
+    upper = np.minimum(source_edges[source_index + 1], target_edges[target_index + 1])
+    weight = upper - lower
+    keep = weight > 0
+    return target_order[target_index[keep]], source_order[source_index[keep]], weight[keep]
+
+# Section 2: The Regridder
+
+class Regridder:
+    """
+    Precomputed mapping from a source lat/lon grid to a target lat/lon grid.
+
+    Both grids are rectilinear, so the mapping is stored per axis: for 'nearest' it is
+    one source index per target row and column, and every later alignment is a single
+    fancy-index gather. For 'area' it is the list of overlapping cell pairs per axis
+    with their overlap weights, giving an area-weighted mean of the source cells.
+    """
+
+    methods = ('nearest', 'area')
+
+    def __init__(self, source_lat, source_lon, target_lat, target_lon, method='nearest'):
+        if method not in self.methods:
+            raise ValueError(f"Unknown regridding method '{method}', expected one of {self.methods}")
+        self.method = method
+        self.source_lat = np.asarray(source_lat, dtype=np.float64)
+        self.source_lon = np.asarray(source_lon, dtype=np.float64)
+        self.target_lat = np.asarray(target_lat, dtype=np.float64)
+        self.target_lon = np.asarray(target_lon, dtype=np.float64)
+
+        if method == 'nearest':
+            self.lat_index = nearest_indices(self.source_lat, self.target_lat)
+            self.lon_index = nearest_indices(self.source_lon, self.target_lon)
+        else:
+            self.lat_weights = overlap_weights(self.source_lat, self.target_lat, latitude=True)
+            self.lon_weights = overlap_weights(self.source_lon, self.target_lon)
+
+    # Subsection 2.1: Applying the Mapping
+
+    def regrid_array(self, data):
+        """
+        Regrid an array whose last two axes are (lat, lon).
+
+        Parameters:
+        - data: Array of shape (..., source lat, source lon).
+
+        Returns:
+        - Array of shape (..., target lat, target lon).
+        """
+        data = np.asarray(data)
+        if self.method == 'nearest':
+            return data[..., self.lat_index[:, None], self.lon_index[None, :]]
+
+        values = data.astype(np.float64)
+        values = self._weighted_sum(values, self.lat_weights, self.target_lat.size, axis=-2)
+        values = self._weighted_sum(values, self.lon_weights, self.target_lon.size, axis=-1)
+        coverage = np.outer(
+            np.bincount(self.lat_weights[0], self.lat_weights[2], self.target_lat.size),
+            np.bincount(self.lon_weights[0], self.lon_weights[2], self.target_lon.size),
+        )
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(coverage > 0, values / coverage, np.nan)
+
+    @staticmethod
+    def _weighted_sum(values, weights, size, axis):
+        target_index, source_index, weight = weights
+        values = np.moveaxis(values, axis, 0)
+        out = np.zeros((size,) + values.shape[1:])
+        np.add.at(out, target_index, values[source_index] * weight.reshape((-1,) + (1,) * (values.ndim - 1)))
+        return np.moveaxis(out, 0, axis)
+
+    def regrid_dataarray(self, da):
+        """
+        Regrid a DataArray that has 'lat' and 'lon' dimensions.
+
+        Parameters:
+        - da: Source DataArray.
+
+        Returns:
+        - DataArray on the target grid with the same dimension order.
+        """
+        other_dims = [dim for dim in da.dims if dim not in ('lat', 'lon')]
+        ordered = da.transpose(*other_dims, 'lat', 'lon')
+        coords = {name: coord for name, coord in ordered.coords.items() if 'lat' not in coord.dims and 'lon' not in coord.dims}
+        coords.update({'lat': self.target_lat, 'lon': self.target_lon})
+        regridded = xr.DataArray(self.regrid_array(ordered.values), dims=ordered.dims, coords=coords, name=da.name, attrs=da.attrs)
+        return regridded.transpose(*da.dims)
+
+    def regrid_dataset(self, ds):
+        """
+        Regrid every variable of a Dataset that has 'lat' and 'lon' dimensions.
+
+        Parameters:
+        - ds: Source Dataset.
+
+        Returns:
+        - Dataset on the target grid; variables without a spatial dimension are kept as they are.
+        """
+        data_vars = {}
+        for name, da in ds.data_vars.items():
+            if 'lat' in da.dims and 'lon' in da.dims:
+                data_vars[name] = self.regrid_dataarray(da)
+            else:
+                data_vars[name] = da.drop_vars([coord for coord in ('lat', 'lon') if coord in da.coords])
+        coords = {name: coord for name, coord in ds.coords.items() if 'lat' not in coord.dims and 'lon' not in coord.dims}
+        coords.update({'lat': self.target_lat, 'lon': self.target_lon})
+        return xr.Dataset(data_vars, coords=coords, attrs=ds.attrs)
+
+    # Subsection 2.2: Persisting the Mapping
+
+    def save(self, file_path):
+        """
+        Save the mapping and both grids to an .npz file.
+
+        Parameters:
+        - file_path: Output path of the .npz file.
+        """
+        arrays = {
+            'method': np.array(self.method),
+            'source_lat': self.source_lat, 'source_lon': self.source_lon,
+            'target_lat': self.target_lat, 'target_lon': self.target_lon,
+        }
+        if self.method == 'nearest':
+            arrays.update(lat_index=self.lat_index, lon_index=self.lon_index)
+        else:
+            for axis, weights in (('lat', self.lat_weights), ('lon', self.lon_weights)):
+                for part, values in zip(('target', 'source', 'weight'), weights):
+                    arrays[f'{axis}_{part}'] = values
+        temporary_path = file_path + '.tmp.npz'
+        np.savez(temporary_path, **arrays)
+        os.replace(temporary_path, file_path)
+
+    @classmethod
+    def load(cls, file_path):
+        """
+        Load a mapping saved with Regridder.save.
+
+        Parameters:
+        - file_path: Path of the .npz file.
+
+        Returns:
+        - Regridder instance.
+        """
+        with np.load(file_path) as arrays:
+            regridder = cls.__new__(cls)
+            regridder.method = str(arrays['method'])
+            for name in ('source_lat', 'source_lon', 'target_lat', 'target_lon'):
+                setattr(regridder, name, arrays[name])
+            if regridder.method == 'nearest':
+                regridder.lat_index = arrays['lat_index']
+                regridder.lon_index = arrays['lon_index']
+            else:
+                regridder.lat_weights = tuple(arrays[f'lat_{part}'] for part in ('target', 'source', 'weight'))
+                regridder.lon_weights = tuple(arrays[f'lon_{part}'] for part in ('target', 'source', 'weight'))
+        return regridder
+
+# Section 3: Cached Regridders
+
+def grid_key(source_lat, source_lon, target_lat, target_lon, method):
+    """
+    Hash a pair of grids and a method into a short cache key.
+
+    Returns:
+    - Hexadecimal digest identifying the mapping.
+    """
+    digest = hashlib.sha1(method.encode())
+    for coords in (source_lat, source_lon, target_lat, target_lon):
+        digest.update(np.ascontiguousarray(coords, dtype=np.float64).tobytes())
+    return digest.hexdigest()[:16]
+
+# Regridders already built or loaded in this process, keyed by grid_key.
+_regridders = {}
+
+def cached_regridder(cache_directory, source_lat, source_lon, target_lat, target_lon, method='nearest'):
+    """
+    Return the regridder between two grids, building and persisting it on first use.
+
+    Parameters:
+    - cache_directory: Directory where mappings are stored, or None to keep them in memory only.
+    - source_lat, source_lon: Source grid coordinates.
+    - target_lat, target_lon: Target grid coordinates.
+    - method: 'nearest' or 'area'.
+
+    Returns:
+    - Regridder instance.
+    """
+    key = grid_key(source_lat, source_lon, target_lat, target_lon, method)
+    if key in _regridders:
+        return _regridders[key]
+
+    file_path = os.path.join(cache_directory, f"regrid_{method}_{key}.npz") if cache_directory else None
+    if file_path and os.path.exists(file_path):
+        regridder = Regridder.load(file_path)
+    else:
+        regridder = Regridder(source_lat, source_lon, target_lat, target_lon, method)
+        if file_path:
+            os.makedirs(cache_directory, exist_ok=True)
+            regridder.save(file_path)
+
+    _regridders[key] = regridder
+    return regridder
@@ -0,0 +1,70 @@
+import numpy as np
+import pandas as pd
+
+# Section 1: Columnar Result Accumulator
+
+class ResultColumns:
+    """
+    Preallocated, typed columns that ranked results are appended to in blocks.
+
+    Every field is stored in its own NumPy array, so appending the top k sites of a
+    city is one slice assignment per field rather than a one-row DataFrame and a
+    pd.concat. The DataFrame is built once, from the filled part of the arrays.
+    """
+
+    def __init__(self, fields, capacity=0):
+        """
+        Parameters:
+        - fields: Dictionary mapping column names to NumPy dtypes, in output column order.
+        - capacity: Number of rows to preallocate; the columns grow when it is exceeded.
+        """
+        self.fields = dict(fields)
+        self.columns = {name: np.empty(capacity, dtype=dtype) for name, dtype in self.fields.items()}
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def _reserve(self, rows):
+        """
+        Make room for more rows, doubling the capacity so repeated growth stays linear.
+        """
+        capacity = len(next(iter(self.columns.values()), []))
+        if self.size + rows <= capacity:
+            return
+        capacity = max(self.size + rows, 2 * capacity)
+        for name, column in self.columns.items():
+            grown = np.empty(capacity, dtype=column.dtype)
+            grown[:self.size] = column[:self.size]
+            self.columns[name] = grown
+
+    def append(self, **values):
+        """
+        Append a block of rows.
+
+        Parameters:
+        - values: One value per field; arrays give one value per row and scalars are
+                  repeated for every row of the block.
+
+        Returns:
+        - Number of rows appended.
+        """
+        missing = set(self.fields) - set(values)
+        if missing:
+            raise KeyError(f"Missing result fields: {sorted(missing)}")
+        rows = max((np.size(value) for value in values.values() if np.ndim(value) > 0), default=1)
+        self._reserve(rows)
+        block = slice(self.size, self.size + rows)
+        for name, value in values.items():
+            self.columns[name][block] = value
+        self.size += rows
+        return rows
+
+    def to_frame(self):
+        """
+        Build the DataFrame of every appended row.
+
+        Returns:
+        - DataFrame with one column per field, in field order.
+        """
+        return pd.DataFrame({name: self.columns[name][:self.size] for name in self.fields})
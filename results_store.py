@@ -0,0 +1,125 @@
+import os
+import shutil
+import numpy as np
+import pyarrow as pa
+import pyarrow.dataset as pa_dataset
+
+# Section 1: Result Schemas
+
+# Columns every result dataset is partitioned by, as hive-style directories
+# (Scenario=2.6/Year=2050/part-0.parquet).
+partition_fields = ['Scenario', 'Year']
+
+# Arrow type of each NumPy dtype used in the ranking fields.
+arrow_types = {
+    np.dtype(object): pa.string(),
+    np.dtype(np.int64): pa.int64(),
+    np.dtype(np.float64): pa.float64(),
+}
+
+def result_schema(fields):
+    """
+    Build the Arrow schema of a ranking table.
+
+    Parameters:
+    - fields: Dictionary mapping column names to NumPy dtypes, in column order.
+
+    Returns:
+    - pyarrow Schema with a leading 'Scenario' string column followed by the fields.
+
+    The schema is declared rather than inferred, so every partition of a dataset has
+    the same column types even when a year has no ranked rows.
+    """
+    columns = [pa.field('Scenario', pa.string())]
+    columns += [pa.field(name, arrow_types[np.dtype(dtype)]) for name, dtype in fields.items()]
+    return pa.schema(columns)
+
+def partitioning(schema):
+    """
+    Return the hive partitioning of a result dataset.
+    """
+    return pa_dataset.partitioning(pa.schema([schema.field(name) for name in partition_fields]), flavor='hive')
+
+# Section 2: Writing and Reading Partitions
+
+def partition_directory(root_directory, scenario, year):
+    """
+    Return the directory of the partition of one scenario and year.
+    """
+    return os.path.join(root_directory, f'Scenario={scenario}', f'Year={year}')
+
+def write_results(df, root_directory, scenario, schema, years=None):
+    """
+    Write a ranking table as Parquet partitions, replacing the partitions of the same scenario and year.
+
+    Parameters:
+    - df: Ranking DataFrame with the schema columns except 'Scenario'.
+    - root_directory: Root directory of the dataset.
+    - scenario: The RCP scenario label the rows belong to.
+    - schema: Arrow schema from result_schema.
+    - years: Years that were recomputed. Their partitions are removed even when the
+             table holds no rows for them, so stale rows are not read back. Defaults
+             to the years present in the table.
+
+    Returns:
+    - The root directory of the dataset.
+    """
+    for year in (years if years is not None else df['Year'].unique()):
+        shutil.rmtree(partition_directory(root_directory, scenario, year), ignore_errors=True)
+    table = pa.Table.from_pandas(df.assign(Scenario=scenario), schema=schema, preserve_index=False)
+    pa_dataset.write_dataset(
+        table,
+        root_directory,
+        format='parquet',
+        partitioning=partitioning(schema),
+        basename_template='part-{i}.parquet',
+        existing_data_behavior='delete_matching',
+        # A single writer thread keeps the rows of each partition in ranking order
+        use_threads=False,
+    )
+    return root_directory
+
+def open_results(root_directory, schema):
+    """
+    Open a result dataset for zero-copy Arrow reads.
+
+    Parameters:
+    - root_directory: Root directory of the dataset.
+    - schema: Arrow schema from result_schema.
+
+    Returns:
+    - pyarrow Dataset; filter it with e.g.
+      dataset.to_table(filter=pyarrow.dataset.field('Scenario') == '2.6').
+    """
+    return pa_dataset.dataset(root_directory, format='parquet', schema=schema, partitioning=partitioning(schema))
+
+def read_results(root_directory, schema, scenario=None, year=None):
+    """
+    Read the rows of a result dataset into a DataFrame.
+
+    Parameters:
+    - root_directory: Root directory of the dataset.
+    - schema: Arrow schema from result_schema.
+    - scenario: Optional scenario label to read.
+    - year: Optional year, or list of years, to read.
+
+    Returns:
+    - DataFrame in schema column order, sorted by year as the pipeline writes it.
+    """
+    expression = None
+    for name, value in (('Scenario', scenario), ('Year', year)):
+        if isinstance(value, (list, tuple)):
+            condition = pa_dataset.field(name).isin([str(item) for item in value])
+            expression = condition if expression is None else expression & condition
+        elif value is not None:
+            condition = pa_dataset.field(name) == str(value)
+            expression = condition if expression is None else expression & condition
+    table = open_results(root_directory, schema).to_table(filter=expression)
+    df = table.select(schema.names).to_pandas()
+    return df.sort_values(['Scenario', 'Year'], kind='stable', ignore_index=True)
+
+def dataset_directory(results_directory, name):
+    """
+    Return the root directory of one named result dataset.
+    """
+    return os.path.join(results_directory, name)
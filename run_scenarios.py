@@ -0,0 +1,150 @@
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+import pandas as pd
+import instrumentation
+import wind_pipeline
+import site_query
+from instrumentation import stage
+
+# Section 1: Processing a Single (Scenario, Year) Unit
+
+def run_unit(scenario, year, *, keep_intermediate_files=False, memory_limit=None, time_resolved=False, turbines=None,
+             max_transmission_km=wind_pipeline.max_transmission_km, allocate=None, site_spacing_km=wind_pipeline.site_spacing_km,
+             top_k=wind_pipeline.top_k):
+    """
+    Build the final file for one scenario and year and rank its locations.
+
+    Parameters:
+    - scenario: The RCP scenario label.
+    - year: The year to process.
+    - keep_intermediate_files: Also write the intermediate merged and essential variable files.
+    - memory_limit: Working memory ceiling in bytes for chunked execution, or None to merge in memory.
+    - time_resolved: Compute power per time step from the sub-annual *_remap.nc files.
+    - turbines: Optional list of catalog turbine names, or 'all', evaluated in the final file.
+    - max_transmission_km: Only rank cells within this distance of each city, or None for the whole domain.
+    - allocate: Also share the cells out between the cities, 'greedy' or 'lp' (greedy then LP refinement).
+    - site_spacing_km: Minimum distance between two ranked sites, or None.
+    - top_k: Number of locations ranked per city and for the whole grid.
+
+    Returns:
+    - Tuple (top_locations, top_locations_no_demand) of DataFrames for the unit.
+    """
+    wind_pipeline.prepare_final_file(scenario, year, keep_intermediate_files=keep_intermediate_files, memory_limit=memory_limit,
+                                     time_resolved=time_resolved, turbines=turbines)
+    if allocate:
+        wind_pipeline.allocate_year(scenario, year, max_transmission_km=max_transmission_km, refine=allocate == 'lp')
+    return wind_pipeline.analyse_year(scenario, year, max_transmission_km=max_transmission_km, site_spacing_km=site_spacing_km, top_k=top_k)
+
+# Section 2: Scheduling Every Unit Across a Process Pool
+
+def run_scenarios(scenarios, years=wind_pipeline.years, max_workers=None, keep_intermediate_files=False, memory_limit=None,
+                  time_resolved=False, turbines=None, excel=False, max_transmission_km=wind_pipeline.max_transmission_km,
+                  allocate=None, site_spacing_km=wind_pipeline.site_spacing_km, top_k=wind_pipeline.top_k):
+    """
+    Run every (scenario, year) unit concurrently and save the per-scenario outputs.
+
+    Parameters:
+    - scenarios: List of RCP scenario labels, e.g. ['2.6', '4.5', '8.5'].
+    - years: List of years to process for every scenario.
+    - max_workers: Size of the process pool. Defaults to one worker per unit,
+                   capped at the number of CPUs on the machine.
+    - keep_intermediate_files: Also write the intermediate merged and essential variable files (debug option).
+    - memory_limit: Working memory ceiling per worker in bytes. When set, every unit is
+                    merged in chunked (dask) mode and streamed to disk chunk by chunk.
+    - time_resolved: Compute power per time step from the daily or sub-daily *_remap.nc
+                     files instead of from the yearly mean climate.
+    - turbines: Optional list of turbine names from turbine_catalog.json, or 'all'. Their
+                power curves are evaluated together and stored on a 'turbine' dimension
+                of every final file. Yearly mean mode only; combining them with
+                time_resolved raises ValueError.
+    - excel: Also export the rankings to the Excel workbooks of each scenario. The
+             Parquet datasets under Results/ are always written.
+    - max_transmission_km: Only rank the cells within this distance of each city (in km).
+                           The cells are looked up in a spatial index, so the cost per
+                           city follows the number of nearby cells. None ranks the whole domain.
+    - allocate: Also assign every viable cell to at most one city to maximise the met
+                demand: 'greedy' for the priority-queue solver, 'lp' to refine it with an
+                LP relaxation (requires scipy). None skips the allocation.
+    - site_spacing_km: Minimum distance between two sites of the same ranking (in km), so
+                       that one wind resource is not reported as a cluster of adjacent
+                       cells. None ranks every cell independently.
+    - top_k: Number of locations reported per city and for the whole grid in every year.
+
+    Returns:
+    - Dictionary mapping each scenario to its (top_locations, top_locations_no_demand) DataFrames.
+    """
+    if time_resolved and turbines:
+        raise ValueError("Turbine catalogs are only evaluated in yearly mean mode, not with time_resolved")
+    units = [(scenario, year) for scenario in scenarios for year in years]
+    if max_workers is None:
+        max_workers = min(len(units), os.cpu_count() or 1)
+
+    # Build the static layer cache before the pool starts so workers only map it
+    wind_pipeline.load_static_layers()
+
+    unit_results = {}
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=wind_pipeline.load_static_layers) as executor:
+        options = {
+            'keep_intermediate_files': keep_intermediate_files, 'memory_limit': memory_limit, 'time_resolved': time_resolved,
+            'turbines': turbines, 'max_transmission_km': max_transmission_km, 'allocate': allocate,
+            'site_spacing_km': site_spacing_km, 'top_k': top_k,
+        }
+        futures = {unit: executor.submit(run_unit, *unit, **options) for unit in units}
+        for unit, future in futures.items():
+            unit_results[unit] = future.result()
+
+    # Merge the yearly results of each scenario in year order
+    scenario_results = {}
+    datasets = ['top_locations', 'top_power_locations', 'supply_curves'] + (['site_allocation'] if allocate else [])
+    for scenario in scenarios:
+        top_locations = pd.concat([unit_results[(scenario, year)][0] for year in years], ignore_index=True)
+        top_locations_no_demand = pd.concat([unit_results[(scenario, year)][1] for year in years], ignore_index=True)
+        wind_pipeline.save_supply_summary(scenario, years)
+        if allocate:
+            wind_pipeline.save_allocation(scenario, years)
+        wind_pipeline.save_scenario_results(scenario, top_locations, top_locations_no_demand, years)
+        if excel:
+            # Only the datasets and years of this run, not partitions left by earlier runs
+            wind_pipeline.export_excel(scenario, years, datasets)
+        scenario_results[scenario] = (top_locations, top_locations_no_demand)
+
+    # Refresh the index behind the site query API with the final files of this run
+    if site_query.final_file_paths(scenarios, years):
+        with stage('site_index'):
+            site_query.build_site_index(scenarios=scenarios, years=years)
+    else:
+        print("Warning: no final files were found for this run, so the site index was not refreshed.")
+
+    return scenario_results
+
+# Section 3: Command Line Entry Point
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run the WindSight model for several RCP scenarios and years.')
+    parser.add_argument('--scenarios', nargs='+', default=wind_pipeline.scenarios, help='RCP scenarios to run.')
+    parser.add_argument('--years', nargs='+', default=wind_pipeline.years, help='Years to process.')
+    parser.add_argument('--workers', type=int, default=None, help='Number of worker processes.')
+    parser.add_argument('--keep-intermediate', action='store_true', help='Keep the Merged and essential_var NetCDF files for debugging.')
+    parser.add_argument('--memory-limit', type=float, default=None, help='Run in chunked mode with this memory ceiling per worker (in GB).')
+    parser.add_argument('--time-resolved', action='store_true', help='Compute power per time step from the *_remap.nc files.')
+    parser.add_argument('--turbines', nargs='+', default=None, help="Turbine models from turbine_catalog.json to evaluate, or 'all'.")
+    parser.add_argument('--max-transmission-km', type=float, default=wind_pipeline.max_transmission_km, help='Only rank cells within this distance of each city (in km).')
+    parser.add_argument('--allocate', choices=['greedy', 'lp'], default=None, help='Also share the cells out between competing cities.')
+    parser.add_argument('--site-spacing-km', type=float, default=wind_pipeline.site_spacing_km, help='Minimum distance between two ranked sites (in km).')
+    parser.add_argument('--top-k', type=int, default=wind_pipeline.top_k, help='Number of locations ranked per city and per year.')
+    parser.add_argument('--excel', action='store_true', help='Also export the rankings to Excel workbooks.')
+    parser.add_argument('--metrics', default=None, help='Write per-stage timing and memory records to this JSON lines file.')
+    parser.add_argument('--trace', default=None, help='Write a Chrome trace of the stages to this file.')
+    args = parser.parse_args()
+    if args.time_resolved and args.turbines:
+        parser.error('--turbines cannot be combined with --time-resolved')
+
+    memory_limit = int(args.memory_limit * 1024**3) if args.memory_limit else None
+    turbines = 'all' if args.turbines == ['all'] else args.turbines
+    instrumentation.configure(args.metrics, args.trace)
+    run_scenarios(args.scenarios, args.years, max_workers=args.workers, keep_intermediate_files=args.keep_intermediate,
+                  memory_limit=memory_limit, time_resolved=args.time_resolved, turbines=turbines, excel=args.excel,
+                  max_transmission_km=args.max_transmission_km, allocate=args.allocate,
+                  site_spacing_km=args.site_spacing_km, top_k=args.top_k)
+    instrumentation.write_chrome_trace()
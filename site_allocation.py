@@ -0,0 +1,314 @@
+import heapq
+import numpy as np
+import pandas as pd
+from city_distance import haversine_distance
+from site_ranking import top_k_indices
+from spatial_index import CellGrid
+
+# SciPy is only needed for the optional LP refinement.
+try:
+    from scipy import sparse
+    from scipy.optimize import linprog
+except ImportError:
+    sparse = None
+    linprog = None
+
+# Section 1: Constants
+
+# Candidate cells ranked per city at a time; a city that runs out ranks twice as many.
+default_candidate_batch = 64
+
+# Bucket size of the spatial index of the viable cells (in degrees); smaller buckets
+# fit the search circles of the cities more tightly.
+allocation_bucket_degrees = 0.5
+
+# Extra candidates per city, beyond those the greedy solver looked at, offered to the LP.
+default_refine_candidates = 32
+
+# Columns of the allocation table, in order, mapped to their dtypes.
+allocation_fields = {
+    'Year': object,
+    'City': object,
+    'Rank': np.int64,
+    'Lat': np.float64,
+    'Lon': np.float64,
+    'Distance_to_City (km)': np.float64,
+    'Annual_Energy_Production (kWh)': np.float64,
+    'Allocated_Energy (kWh)': np.float64,
+    'City_Energy_Demand (kWh)': np.float64,
+    'Cumulative_Demand_Satisfaction (%)': np.float64,
+}
+
+# Section 2: Candidate Cells of a City
+
+class CityCandidates:
+    """
+    The cells within reach of one city, ranked lazily by the energy they deliver to it.
+
+    Only the best batch of cells is ranked up front. When all of them have been
+    assigned or taken by other cities, the cells taken so far are dropped and the
+    ranking is extended to twice as many cells. Rankings from top_k_indices are
+    prefixes of one stable order, so the result is the same as ranking every cell up
+    front. The ranked prefix is kept as Python lists because the solver reads it one
+    element at a time.
+    """
+
+    def __init__(self, positions, energy, batch=default_candidate_batch):
+        """
+        Parameters:
+        - positions: Positions of the reachable cells in the cell arrays.
+        - energy: Annual energy (kWh) each cell delivers to the city after transmission loss.
+        - batch: Number of cells ranked up front.
+        """
+        self.positions = self.reachable_positions = positions
+        self.energy = self.reachable_energy = energy
+        self._rank(batch)
+
+    def passed(self):
+        """
+        Return the number of reachable cells the solver has assigned or skipped so far.
+        """
+        return self.reachable_energy.size - self.energy.size + self.next
+
+    def _rank(self, count):
+        order = top_k_indices(self.energy, count)
+        self.ranked_cells = self.positions[order].tolist()
+        self.ranked_energy = self.energy[order].tolist()
+        self.next = 0
+
+    def peek(self, taken):
+        """
+        Move to the best candidate that no city has taken yet.
+
+        Parameters:
+        - taken: bytearray over all cells, non-zero for the assigned ones.
+
+        Returns:
+        - True if there is such a candidate; its cell and energy are
+          ranked_cells[next] and ranked_energy[next].
+        """
+        while True:
+            ranked = len(self.ranked_cells)
+            while self.next < ranked and taken[self.ranked_cells[self.next]]:
+                self.next += 1
+            if self.next < ranked:
+                return True
+            if ranked >= self.energy.size:
+                return False
+            # Drop the cells taken since the last ranking, then rank further
+            free = np.frombuffer(taken, dtype=np.uint8)[self.positions] == 0
+            self.positions, self.energy = self.positions[free], self.energy[free]
+            self._rank(2 * ranked)
+
+def city_candidates(cell_grid, production, city_lats, city_lons, radius_km, loss_factor, batch=default_candidate_batch):
+    """
+    Find the reachable cells of every city.
+
+    Parameters:
+    - cell_grid: spatial_index.CellGrid over the viable cells.
+    - production: Annual energy production (kWh) of every viable cell.
+    - city_lats, city_lons: City coordinates in degrees.
+    - radius_km: Maximum transmission distance.
+    - loss_factor: Function mapping an array of distances to the fraction of power left.
+    - batch: Number of cells ranked up front per city.
+
+    Returns:
+    - List of CityCandidates, one per city.
+    """
+    candidates = []
+    for city_lat, city_lon in zip(city_lats, city_lons):
+        positions, distance = cell_grid.within(city_lat, city_lon, radius_km)
+        candidates.append(CityCandidates(positions, production[positions] * loss_factor(distance), batch))
+    return candidates
+
+# Section 3: Greedy Allocation
+
+def greedy_allocation(candidates, demands, cell_count):
+    """
+    Assign cells to cities, each cell to at most one city, to meet as much demand as possible.
+
+    Parameters:
+    - candidates: List of CityCandidates, one per city.
+    - demands: Annual energy demand (kWh) of every city.
+    - cell_count: Number of viable cells.
+
+    Returns:
+    - List of (city index, cell position, delivered energy) in the order they were assigned.
+
+    The heap holds one entry per city, keyed by the demand its best free cell would
+    meet: the cell's delivered energy, capped at the city's unmet demand. The best
+    entry is assigned after checking that its key is still current; keys only fall as
+    cells are taken and demand is met, so an entry whose key has gone stale is pushed
+    back with its new key. The work is proportional to the assignments and skipped
+    cells rather than to the number of city-cell pairs.
+    """
+    remaining = np.asarray(demands, dtype=np.float64).tolist()
+    taken = bytearray(cell_count)
+    heap = []
+
+    def push(city):
+        options = candidates[city]
+        if remaining[city] > 0 and options.peek(taken):
+            heapq.heappush(heap, (-min(options.ranked_energy[options.next], remaining[city]), city))
+
+    for city in range(len(candidates)):
+        push(city)
+
+    assignments = []
+    while heap:
+        key, city = heapq.heappop(heap)
+        options = candidates[city]
+        if remaining[city] <= 0 or not options.peek(taken):
+            continue
+        energy = options.ranked_energy[options.next]
+        value = min(energy, remaining[city])
+        if value < -key:
+            # Another city took the cell, or the cap fell, since the entry was pushed
+            heapq.heappush(heap, (-value, city))
+            continue
+        cell = options.ranked_cells[options.next]
+        taken[cell] = 1
+        remaining[city] -= value
+        assignments.append((city, cell, energy))
+        options.next += 1
+        push(city)
+    return assignments
+
+def met_demand(demands, assignments):
+    """
+    Return the demand each city meets with its assigned cells.
+    """
+    delivered = np.zeros(len(demands))
+    for city, _, energy in assignments:
+        delivered[city] += energy
+    return np.minimum(delivered, demands)
+
+# Section 4: Optional LP Refinement
+
+def refine_allocation(candidates, demands, assignments, extra_candidates=default_refine_candidates):
+    """
+    Improve a greedy allocation with the LP relaxation of the assignment problem.
+
+    Parameters:
+    - candidates: List of CityCandidates after greedy_allocation.
+    - demands: Annual energy demand (kWh) of every city.
+    - assignments: Greedy (city index, cell position, delivered energy) assignments.
+    - extra_candidates: Cells per city, beyond those the greedy solver passed, offered to the LP.
+
+    Returns:
+    - Tuple (assignments, upper_bound): the better of the greedy and the rounded LP
+      allocation, and the LP bound on the met demand over the offered cells.
+
+    The LP assigns fractions of cells: maximise the met demand m_i subject to
+    m_i <= demand_i, m_i <= sum_j energy_ij x_ij and sum_i x_ij <= 1 for every cell.
+    Every cell is then given to the city with the largest fraction of it. Requires SciPy.
+    """
+    if linprog is None:
+        raise ImportError("The LP refinement requires scipy")
+    if not candidates:
+        return assignments, 0.0
+
+    # Candidate pairs: every cell a city passed in the greedy run plus a few more
+    pair_cities, pair_cells, pair_energy = [], [], []
+    for city, options in enumerate(candidates):
+        ranked = top_k_indices(options.reachable_energy, options.passed() + extra_candidates)
+        pair_cities.append(np.full(ranked.size, city))
+        pair_cells.append(options.reachable_positions[ranked])
+        pair_energy.append(options.reachable_energy[ranked])
+    pair_cities = np.concatenate(pair_cities)
+    pair_cells = np.concatenate(pair_cells).astype(np.int64)
+    pair_energy = np.concatenate(pair_energy)
+
+    pairs, cities = pair_cities.size, len(candidates)
+    cells, cell_rows = np.unique(pair_cells, return_inverse=True)
+    # Variables: one fraction per pair, then the met demand of every city
+    city_rows = sparse.csr_matrix(
+        (np.concatenate([-pair_energy, np.ones(cities)]),
+         (np.concatenate([pair_cities, np.arange(cities)]), np.concatenate([np.arange(pairs), pairs + np.arange(cities)]))),
+        shape=(cities, pairs + cities),
+    )
+    cell_rows = sparse.csr_matrix((np.ones(pairs), (cell_rows, np.arange(pairs))), shape=(cells.size, pairs + cities))
+    result = linprog(
+        c=np.concatenate([np.zeros(pairs), -np.ones(cities)]),
+        A_ub=sparse.vstack([city_rows, cell_rows]),
+        b_ub=np.concatenate([np.zeros(cities), np.ones(cells.size)]),
+        bounds=np.concatenate([np.tile([0.0, 1.0], (pairs, 1)), np.column_stack([np.zeros(cities), demands])]),
+        method='highs',
+    )
+    if not result.success:
+        print(f"The LP refinement failed ({result.message}); keeping the greedy allocation.")
+        return assignments, np.nan
+
+    # Round: every cell goes to the pair holding its largest fraction
+    fractions = result.x[:pairs]
+    order = np.lexsort((-fractions, pair_cells))
+    first = np.ones(pairs, dtype=bool)
+    first[1:] = pair_cells[order][1:] != pair_cells[order][:-1]
+    chosen = order[first & (fractions[order] > 1e-9)]
+    rounded = [(int(pair_cities[pair]), int(pair_cells[pair]), float(pair_energy[pair])) for pair in chosen]
+
+    upper_bound = -result.fun
+    if met_demand(demands, rounded).sum() > met_demand(demands, assignments).sum():
+        return rounded, upper_bound
+    return assignments, upper_bound
+
+# Section 5: Allocation Table
+
+def allocate_sites(cell_lat, cell_lon, production, cities, radius_km, loss_factor, year, refine=False):
+    """
+    Allocate viable cells to the cities of a demand projection.
+
+    Parameters:
+    - cell_lat, cell_lon: Coordinates of the viable cells in degrees.
+    - production: Annual energy production (kWh) of every viable cell.
+    - cities: DataFrame with 'City', 'Latitude', 'Longitude' and 'Energy Demand (kWh)'.
+    - radius_km: Maximum transmission distance between a city and its cells.
+    - loss_factor: Function mapping an array of distances to the fraction of power left.
+    - year: Year label written in the 'Year' column.
+    - refine: Also run the LP refinement (requires SciPy).
+
+    Returns:
+    - DataFrame with the columns of allocation_fields: the cells of every city in
+      descending order of delivered energy, the part of it that meets demand, and the
+      running share of the demand met.
+    """
+    demands = cities['Energy Demand (kWh)'].to_numpy(dtype=np.float64)
+    city_lats = cities['Latitude'].to_numpy(dtype=np.float64)
+    city_lons = cities['Longitude'].to_numpy(dtype=np.float64)
+    cell_lat, cell_lon = np.asarray(cell_lat, dtype=np.float64), np.asarray(cell_lon, dtype=np.float64)
+    cell_grid = CellGrid(cell_lat, cell_lon, allocation_bucket_degrees)
+    candidates = city_candidates(cell_grid, production, city_lats, city_lons, radius_km, loss_factor)
+    assignments = greedy_allocation(candidates, demands, len(cell_grid))
+    met = met_demand(demands, assignments).sum()
+    print(f"Greedy allocation of {len(assignments)} cells meets {met:.6g} of {demands.sum():.6g} kWh of demand")
+    if refine:
+        assignments, upper_bound = refine_allocation(candidates, demands, assignments)
+        print(f"Refined allocation meets {met_demand(demands, assignments).sum():.6g} kWh (LP bound {upper_bound:.6g} kWh)")
+
+    # Group the assignments by city in table order, best cell first
+    assignments = sorted(assignments, key=lambda assignment: (assignment[0], -assignment[2], assignment[1]))
+    city_index = np.array([city for city, _, _ in assignments], dtype=np.int64)
+    positions = np.array([cell for _, cell, _ in assignments], dtype=np.int64)
+    energy = np.array([energy for _, _, energy in assignments], dtype=np.float64)
+    distance = haversine_distance(city_lats[city_index], city_lons[city_index], cell_lat[positions], cell_lon[positions])
+
+    # Running energy per city, capped at its demand
+    starts = np.searchsorted(city_index, np.arange(len(candidates)))
+    cumulative = np.concatenate([[0.0], np.cumsum(energy)])
+    delivered = cumulative[1:] - cumulative[starts[city_index]]
+    demand = demands[city_index]
+    allocated = np.minimum(delivered, demand) - np.minimum(delivered - energy, demand)
+    rank = np.arange(energy.size) - starts[city_index] + 1
+
+    return pd.DataFrame({
+        'Year': year,
+        'City': cities['City'].to_numpy()[city_index],
+        'Rank': rank,
+        'Lat': cell_lat[positions],
+        'Lon': cell_lon[positions],
+        'Distance_to_City (km)': distance,
+        'Annual_Energy_Production (kWh)': energy,
+        'Allocated_Energy (kWh)': allocated,
+        'City_Energy_Demand (kWh)': demand,
+        'Cumulative_Demand_Satisfaction (%)': np.divide(np.minimum(delivered, demand) * 100, demand, out=np.zeros_like(demand), where=demand > 0),
+    }, columns=list(allocation_fields)).astype(allocation_fields)
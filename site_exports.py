@@ -0,0 +1,205 @@
+import json
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+from xml.sax.saxutils import escape
+
+# Section 1: Batches of Ranked Sites
+
+# Number of sites formatted and written at a time; the text and Arrow buffers of an
+# export depend on this rather than on the number of sites.
+export_batch_rows = 8192
+
+def frame_batches(df, batch_rows=export_batch_rows):
+    """
+    Split a ranking DataFrame into column batches.
+
+    Parameters:
+    - df: Ranking DataFrame holding at least 'Lat' and 'Lon'.
+    - batch_rows: Number of rows per batch.
+
+    Returns:
+    - Generator of dictionaries mapping every column name to a NumPy array slice.
+    """
+    columns = {name: df[name].to_numpy() for name in df.columns}
+    for start in range(0, len(df), batch_rows):
+        yield {name: values[start:start + batch_rows] for name, values in columns.items()}
+
+def _python_rows(batch):
+    """
+    Convert a column batch into rows of JSON-compatible Python values (NaN becomes None).
+    """
+    columns = []
+    for values in batch.values():
+        values = values.tolist()
+        columns.append([None if value != value else value for value in values] if values and isinstance(values[0], float) else values)
+    return zip(*columns)
+
+# Section 2: KML
+
+kml_header = '<?xml version="1.0" encoding="UTF-8"?>\n<kml xmlns="http://www.opengis.net/kml/2.2">\n<Document>\n'
+kml_footer = '</Document>\n</kml>\n'
+
+def write_kml(batches, file_path):
+    """
+    Write ranked sites as KML placemarks, one batch at a time.
+
+    Parameters:
+    - batches: Iterable of column batches from frame_batches.
+    - file_path: Output KML file.
+
+    Returns:
+    - Number of placemarks written.
+
+    Every placemark is named '{Year} - Rank {Rank}' as in Google Earth before, and
+    carries every ranking column as ExtendedData.
+    """
+    count = 0
+    with open(file_path, 'w', encoding='utf-8') as f:
+        f.write(kml_header)
+        for batch in batches:
+            names = list(batch)
+            data_tags = [f'<Data name="{escape(name, {chr(34): "&quot;"})}"><value>' for name in names]
+            placemarks = []
+            for row in _python_rows(batch):
+                values = dict(zip(names, row))
+                label = escape(f"{values.get('Year')} - Rank {values.get('Rank')}")
+                extended = ''.join(f'{tag}{"" if value is None else escape(str(value))}</value></Data>' for tag, value in zip(data_tags, row))
+                placemarks.append(
+                    f'<Placemark><name>{label}</name>'
+                    f'<description>Year: {escape(str(values.get("Year")))}, Rank: {values.get("Rank")}</description>'
+                    f'<ExtendedData>{extended}</ExtendedData>'
+                    f'<Point><coordinates>{values["Lon"]!r},{values["Lat"]!r},0.0</coordinates></Point></Placemark>\n'
+                )
+            f.write(''.join(placemarks))
+            count += len(placemarks)
+        f.write(kml_footer)
+    return count
+
+# Section 3: GeoJSON
+
+def write_geojson(batches, file_path):
+    """
+    Write ranked sites as a GeoJSON FeatureCollection of points, one batch at a time.
+
+    Parameters:
+    - batches: Iterable of column batches from frame_batches.
+    - file_path: Output GeoJSON file.
+
+    Returns:
+    - Number of features written.
+
+    Every ranking column becomes a feature property; missing values are written as null.
+    """
+    count = 0
+    with open(file_path, 'w', encoding='utf-8') as f:
+        f.write('{"type": "FeatureCollection", "features": [\n')
+        for batch in batches:
+            names = list(batch)
+            features = [
+                {'type': 'Feature',
+                 'geometry': {'type': 'Point', 'coordinates': [properties['Lon'], properties['Lat']]},
+                 'properties': properties}
+                for properties in (dict(zip(names, row)) for row in _python_rows(batch))
+            ]
+            if not features:
+                continue
+            # One dumps call per batch, joined into the surrounding array
+            f.write((',\n' if count else '') + json.dumps(features, allow_nan=False)[1:-1])
+            count += len(features)
+        f.write('\n]}\n')
+    return count
+
+# Section 4: GeoParquet
+
+# Size of a little-endian 2D WKB point: byte order, geometry type and two doubles.
+wkb_point_dtype = np.dtype([('byte_order', 'u1'), ('geometry_type', '<u4'), ('x', '<f8'), ('y', '<f8')])
+
+def wkb_points(lon, lat):
+    """
+    Encode coordinates as WKB points without a Python loop.
+
+    Parameters:
+    - lon: Array of longitudes.
+    - lat: Array of latitudes.
+
+    Returns:
+    - pyarrow binary array with one 21-byte WKB point per site.
+    """
+    points = np.empty(len(lon), dtype=wkb_point_dtype)
+    points['byte_order'] = 1
+    points['geometry_type'] = 1
+    points['x'] = lon
+    points['y'] = lat
+    offsets = np.arange(len(lon) + 1, dtype=np.int32) * wkb_point_dtype.itemsize
+    return pa.Array.from_buffers(pa.binary(), len(lon), [None, pa.py_buffer(offsets), pa.py_buffer(points.tobytes())])
+
+def geoparquet_metadata():
+    """
+    Return the GeoParquet 1.0 file metadata of a 'geometry' column of WGS84 points.
+    """
+    geo = {
+        'version': '1.0.0',
+        'primary_column': 'geometry',
+        'columns': {'geometry': {'encoding': 'WKB', 'geometry_types': ['Point']}},
+    }
+    return {b'geo': json.dumps(geo).encode()}
+
+def write_geoparquet(batches, file_path, schema):
+    """
+    Write ranked sites as GeoParquet, one row group per batch.
+
+    Parameters:
+    - batches: Iterable of column batches from frame_batches.
+    - file_path: Output Parquet file.
+    - schema: Arrow schema of the ranking columns, e.g. from results_store.result_schema.
+              Columns of the schema that the batches do not hold are left out.
+
+    Returns:
+    - Number of rows written.
+
+    The file holds every ranking column plus a WKB 'geometry' column, so GeoPandas,
+    QGIS and DuckDB read it as point features.
+    """
+    writer = None
+    count = 0
+    try:
+        for batch in batches:
+            if writer is None:
+                fields = [schema.field(name) for name in schema.names if name in batch]
+                file_schema = pa.schema(fields + [pa.field('geometry', pa.binary())], metadata=geoparquet_metadata())
+                writer = pq.ParquetWriter(file_path, file_schema)
+            arrays = [pa.array(batch[field.name], type=field.type, from_pandas=True) for field in fields]
+            arrays.append(wkb_points(batch['Lon'], batch['Lat']))
+            writer.write_table(pa.Table.from_arrays(arrays, schema=file_schema))
+            count += len(batch['Lon'])
+    finally:
+        if writer is not None:
+            writer.close()
+    if writer is None:
+        # No batches: still write an empty file with the full schema
+        file_schema = pa.schema(list(schema) + [pa.field('geometry', pa.binary())], metadata=geoparquet_metadata())
+        pq.write_table(file_schema.empty_table(), file_path)
+    return count
+
+# Section 5: Exporting a Ranking Table
+
+def export_sites(df, file_stem, schema, batch_rows=export_batch_rows):
+    """
+    Export a ranking table to KML, GeoJSON and GeoParquet.
+
+    Parameters:
+    - df: Ranking DataFrame.
+    - file_stem: Output path without extension; the files are {file_stem}.kml,
+                 {file_stem}.geojson and {file_stem}.parquet.
+    - schema: Arrow schema of the ranking columns.
+    - batch_rows: Number of sites written at a time.
+
+    Returns:
+    - Tuple of the three file paths.
+    """
+    paths = (f"{file_stem}.kml", f"{file_stem}.geojson", f"{file_stem}.parquet")
+    write_kml(frame_batches(df, batch_rows), paths[0])
+    write_geojson(frame_batches(df, batch_rows), paths[1])
+    write_geoparquet(frame_batches(df, batch_rows), paths[2], schema)
+    return paths
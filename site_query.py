@@ -0,0 +1,306 @@
+import argparse
+import json
+import os
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+import numpy as np
+import pandas as pd
+import wind_pipeline
+from build_cache import stage_signature, is_up_to_date, record_stamp
+from city_distance import haversine_distance
+from site_spacing import spaced_top_k_indices
+from spatial_index import CellGrid
+
+# Section 1: Building the Site Index
+
+# Index of every viable cell and its power in every (scenario, year) unit.
+site_index_file_path = os.path.join(wind_pipeline.results_directory, 'site_index.npz')
+index_format_version = 2  # Bump when the arrays of the index change.
+
+def final_file_paths(scenarios=wind_pipeline.scenarios, years=wind_pipeline.years):
+    """
+    Find the final files that exist for the given scenarios and years.
+
+    Returns:
+    - Dictionary mapping (scenario, year) to the final file path.
+    """
+    file_paths = {}
+    for scenario in scenarios:
+        final_files_directory = os.path.join(wind_pipeline.base_directory, f'RCP_{scenario}/Code/final_files')
+        for year in years:
+            file_path = os.path.join(final_files_directory, f'final_file_{year}.nc')
+            if os.path.exists(file_path):
+                file_paths[(scenario, year)] = file_path
+    return file_paths
+
+def build_site_index(index_path=site_index_file_path, scenarios=wind_pipeline.scenarios, years=wind_pipeline.years):
+    """
+    Collect the power of every viable cell of every available final file into one index.
+
+    Parameters:
+    - index_path: Output .npz file.
+    - scenarios: Scenarios to index.
+    - years: Years to index.
+
+    Returns:
+    - The index file path.
+
+    The index holds the coordinates of the cells that are viable in at least one unit
+    and a (unit, cell) power matrix, zero where a cell is excluded in that unit, merged
+    from the sparse viable cell stores of the units. It is stamped with the hashes of
+    the final files, so it is only rebuilt when they change.
+    """
+    file_paths = final_file_paths(scenarios, years)
+    if not file_paths:
+        raise FileNotFoundError(f"No final files found under {wind_pipeline.base_directory}; run the model first.")
+
+    inputs = {f'{scenario}/{year}': file_path for (scenario, year), file_path in file_paths.items()}
+    signature, details = stage_signature(inputs, {'pipeline_version': wind_pipeline.pipeline_version, 'index_format_version': index_format_version})
+    if is_up_to_date(index_path, signature):
+        print("The site index is up to date.")
+        return index_path
+
+    units = list(file_paths)
+    stores = [wind_pipeline.load_viable_cells(*unit) for unit in units]
+    grid = (stores[0].grid_lat, stores[0].grid_lon)
+    for unit, viable in zip(units, stores):
+        if not (np.array_equal(grid[0], viable.grid_lat) and np.array_equal(grid[1], viable.grid_lon)):
+            raise ValueError(f"The final file of RCP {unit[0]} {unit[1]} is not on the grid of the other units")
+
+    # Keep the cells that are viable in at least one unit, zero where a unit excludes them
+    cells = np.unique(np.concatenate([viable.cells for viable in stores]))
+    power = np.zeros((len(units), cells.size), dtype=np.float64)
+    for unit_index, viable in enumerate(stores):
+        power[unit_index, np.searchsorted(cells, viable.cells)] = viable.power
+    cell_lat, cell_lon = np.unravel_index(cells, (grid[0].size, grid[1].size))
+
+    os.makedirs(os.path.dirname(index_path), exist_ok=True)
+    # Write through a file object so np.savez does not append a second extension
+    with open(index_path, 'wb') as f:
+        np.savez(
+            f,
+            scenarios=np.array([scenario for scenario, _ in units]),
+            years=np.array([year for _, year in units]),
+            # Hours integrated by time-resolved units, NaN for yearly mean units
+            hours=np.array([np.nan if viable.hours is None else viable.hours for viable in stores]),
+            lat=grid[0][cell_lat],
+            lon=grid[1][cell_lon],
+            power=power,
+        )
+    record_stamp(index_path, signature, details)
+    print(f"Site index of {len(units)} units and {cells.size} cells saved at {index_path}")
+    return index_path
+
+# Section 2: Querying the Index
+
+class SiteIndex:
+    """
+    In-memory index of the viable cells of every (scenario, year) unit.
+
+    Queries rank the cells of one unit by power after the transmission loss to a city,
+    the same way as the per-city rankings of the pipeline, optionally within a radius.
+    """
+
+    def __init__(self, index_path=site_index_file_path):
+        """
+        Parameters:
+        - index_path: Index file written by build_site_index.
+        """
+        with np.load(index_path) as index:
+            self.lat = index['lat']
+            self.lon = index['lon']
+            self.power = index['power']
+            self.hours = [None if np.isnan(hours) else float(hours) for hours in index['hours']]
+            self.units = {(str(scenario), str(year)): row for row, (scenario, year) in enumerate(zip(index['scenarios'], index['years']))}
+        # Radius queries only look at the cells in the buckets around the location
+        self.cell_grid = CellGrid(self.lat, self.lon)
+        self._cities = {}
+
+    def cities(self, year):
+        """
+        Return the cities of a year's demand projection, indexed by lower-case name.
+        """
+        if year not in self._cities:
+            file_path = os.path.join(wind_pipeline.population_directory, f'city_power_demand_projection_{year}.csv')
+            cities = pd.read_csv(file_path) if os.path.exists(file_path) else pd.DataFrame(columns=['City', 'Latitude', 'Longitude', 'Energy Demand (kWh)'])
+            self._cities[year] = cities.set_index(cities['City'].str.lower())
+        return self._cities[year]
+
+    def query(self, scenario, year, city=None, lat=None, lon=None, radius_km=None, top_k=wind_pipeline.top_k, spacing_km=None):
+        """
+        Rank the best sites of one scenario and year.
+
+        Parameters:
+        - scenario: The RCP scenario label.
+        - year: The year.
+        - city: Name of a city in the year's demand projection (case-insensitive).
+        - lat, lon: Coordinates of an ad hoc location, used instead of a city.
+        - radius_km: Only consider cells within this distance of the city or location.
+        - top_k: Number of sites to return.
+        - spacing_km: Minimum distance between two returned sites, or None.
+
+        Returns:
+        - DataFrame with the columns of the per-city rankings. Without a city or location,
+          the cells are ranked by their own power and the distance columns are NaN.
+        """
+        scenario, year = str(scenario), str(year)
+        if (scenario, year) not in self.units:
+            raise KeyError(f"RCP {scenario} {year} is not in the site index")
+        power = self.power[self.units[(scenario, year)]]
+        hours = self.hours[self.units[(scenario, year)]]
+
+        if (lat is None) != (lon is None):
+            raise ValueError("lat and lon must be given together")
+
+        demand = np.nan
+        if city is not None:
+            cities = self.cities(year)
+            if city.lower() not in cities.index:
+                raise KeyError(f"Unknown city '{city}' for {year}")
+            row = cities.loc[city.lower()]
+            city, lat, lon, demand = row['City'], row['Latitude'], row['Longitude'], row['Energy Demand (kWh)']
+        elif lat is None and radius_km is not None:
+            raise ValueError("A radius needs a city or a lat/lon location")
+
+        if radius_km is not None:
+            candidates, distance = self.cell_grid.within(lat, lon, float(radius_km))
+            viable = power[candidates] > 0
+            candidates, distance = candidates[viable], distance[viable]
+        else:
+            candidates = np.flatnonzero(power > 0)
+            if lat is not None:
+                distance = haversine_distance(float(lat), float(lon), self.lat[candidates], self.lon[candidates])
+        if lat is not None:
+            adjusted_power = wind_pipeline.calculate_power_loss(power[candidates], distance)
+        else:
+            distance = np.full(candidates.size, np.nan)
+            adjusted_power = power[candidates]
+
+        top_cells = spaced_top_k_indices(adjusted_power, self.lat[candidates], self.lon[candidates], top_k, spacing_km)
+        adjusted_power = adjusted_power[top_cells]
+        annual_production = wind_pipeline.annual_energy(adjusted_power, hours)
+        return pd.DataFrame({
+            'Scenario': scenario,
+            'Year': year,
+            'City': city,
+            'Rank': np.arange(1, top_cells.size + 1),
+            'Lat': self.lat[candidates[top_cells]],
+            'Lon': self.lon[candidates[top_cells]],
+            'Distance_to_City (km)': distance[top_cells],
+            'Adjusted_Daily_Power (kW)': adjusted_power,
+            'Annual_Energy_Production (kWh)': annual_production,
+            'City_Energy_Demand (kWh)': demand,
+            'Demand_Satisfaction (%)': annual_production / demand * 100 if demand else np.nan,
+            'Capacity Factor (%)': annual_production / wind_pipeline.max_annual_output * 100,
+        })
+
+# Section 3: Local HTTP Service
+
+# Query string parameters of GET /sites and how they are converted.
+query_parameters = {
+    'scenario': str,
+    'year': str,
+    'city': str,
+    'lat': float,
+    'lon': float,
+    'radius_km': float,
+    'top_k': int,
+    'spacing_km': float,
+}
+
+def make_handler(index):
+    """
+    Build a request handler class answering queries from one SiteIndex.
+
+    Routes:
+    - GET /sites?scenario=8.5&year=2075&city=Glasgow&radius_km=150&top_k=25
+    - GET /sites?scenario=8.5&year=2075&lat=55.9&lon=-4.3&radius_km=150
+    - GET /sites?scenario=8.5&year=2075&city=Glasgow&spacing_km=20
+    - GET /cities?year=2075
+    - GET /units
+    """
+    class SiteQueryHandler(BaseHTTPRequestHandler):
+        def send_json(self, status, payload):
+            body = json.dumps(payload, allow_nan=False).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            arguments = {name: values[-1] for name, values in parse_qs(url.query).items()}
+            try:
+                if url.path == '/sites':
+                    unknown = set(arguments) - set(query_parameters)
+                    if unknown:
+                        raise ValueError(f"Unknown query parameters: {sorted(unknown)}")
+                    if ('lat' in arguments) != ('lon' in arguments):
+                        raise ValueError("lat and lon must be given together")
+                    sites = index.query(**{name: query_parameters[name](value) for name, value in arguments.items()})
+                    # NaN is not valid JSON, so missing values are sent as null
+                    self.send_json(200, sites.astype(object).where(sites.notna(), None).to_dict(orient='records'))
+                elif url.path == '/cities':
+                    cities = index.cities(arguments['year'])
+                    self.send_json(200, cities['City'].tolist())
+                elif url.path == '/units':
+                    self.send_json(200, [{'scenario': scenario, 'year': year} for scenario, year in index.units])
+                else:
+                    self.send_json(404, {'error': f"Unknown path {url.path}"})
+            except (KeyError, ValueError, TypeError) as error:
+                self.send_json(400, {'error': str(error).strip('"')})
+
+        def log_message(self, format, *args):
+            pass
+
+    return SiteQueryHandler
+
+def serve(index, host='127.0.0.1', port=8000):
+    """
+    Answer site queries over HTTP until interrupted.
+
+    Parameters:
+    - index: SiteIndex to query.
+    - host: Interface to listen on; the default only accepts local connections.
+    - port: Port to listen on.
+    """
+    server = ThreadingHTTPServer((host, port), make_handler(index))
+    print(f"Site query service listening on http://{host}:{server.server_port}/sites")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+# Section 4: Command Line Entry Point
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Query the best wind farm sites from the precomputed scenario results.')
+    parser.add_argument('--index', default=site_index_file_path, help='Site index file.')
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('build', help='Build or refresh the site index from the final files.')
+    query_parser = commands.add_parser('query', help='Print the top sites of one query.')
+    query_parser.add_argument('--scenario', required=True, help='RCP scenario, e.g. 8.5.')
+    query_parser.add_argument('--year', required=True, help='Year, e.g. 2075.')
+    query_parser.add_argument('--city', default=None, help='City from the demand projection.')
+    query_parser.add_argument('--lat', type=float, default=None, help='Latitude of an ad hoc location.')
+    query_parser.add_argument('--lon', type=float, default=None, help='Longitude of an ad hoc location.')
+    query_parser.add_argument('--radius-km', type=float, default=None, help='Search radius in km.')
+    query_parser.add_argument('--spacing-km', type=float, default=None, help='Minimum distance between two sites in km.')
+    query_parser.add_argument('--top-k', type=int, default=wind_pipeline.top_k, help='Number of sites.')
+    serve_parser = commands.add_parser('serve', help='Answer queries over HTTP.')
+    serve_parser.add_argument('--host', default='127.0.0.1', help='Interface to listen on.')
+    serve_parser.add_argument('--port', type=int, default=8000, help='Port to listen on.')
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        build_site_index(args.index)
+    elif args.command == 'query':
+        if (args.lat is None) != (args.lon is None):
+            query_parser.error('--lat and --lon must be given together')
+        index = SiteIndex(args.index)
+        print(index.query(args.scenario, args.year, args.city, args.lat, args.lon, args.radius_km, args.top_k, args.spacing_km).to_string(index=False))
+    else:
+        serve(SiteIndex(args.index), args.host, args.port)
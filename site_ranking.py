@@ -0,0 +1,35 @@
+import numpy as np
+
+# Section 1: Partial-Selection Ranking
+
+def top_k_indices(values, k):
+    """
+    Find the positions of the k largest values without sorting the whole array.
+
+    Parameters:
+    - values: 1D array of ranking scores (NaN values must be masked out beforehand).
+    - k: Number of positions to return.
+
+    Returns:
+    - Integer array of at most k positions, ordered by descending value.
+
+    Ties are broken by position, so the result is identical to taking the first k
+    entries of a stable descending sort. Only the selected entries are ever sorted,
+    which keeps the cost close to a single pass over the scores.
+    """
+    values = np.asarray(values).ravel()
+    k = min(int(k), values.size)
+    if k <= 0:
+        return np.empty(0, dtype=np.intp)
+
+    if k < values.size:
+        # Partition the k largest scores to the end, then resolve ties at the boundary by position
+        kth_value = values[np.argpartition(values, values.size - k)[values.size - k:]].min()
+        above = np.flatnonzero(values > kth_value)
+        tied = np.flatnonzero(values == kth_value)[:k - above.size]
+        candidates = np.concatenate([above, tied])
+    else:
+        candidates = np.arange(values.size)
+
+    order = np.lexsort((candidates, -values[candidates]))
+    return candidates[order]
@@ -0,0 +1,108 @@
+import numpy as np
+from city_distance import earth_radius_km
+from site_ranking import top_k_indices
+
+# Section 1: Spatial Hash of Chosen Sites
+
+class SiteHash:
+    """
+    Spatial hash of the sites chosen so far, for minimum-spacing checks.
+
+    Sites are hashed by their position on the sphere as 3D points (in km), in cubes as
+    wide as the chord of the spacing. Two sites closer than the spacing along the
+    surface are closer than that chord in 3D, so only the 27 cubes around a candidate
+    need to be checked, wherever it lies, including near the poles and the antimeridian.
+    """
+
+    def __init__(self, spacing_km):
+        """
+        Parameters:
+        - spacing_km: Minimum great-circle distance between two chosen sites.
+        """
+        # Chord of the spacing; spacings beyond half the circumference reach every point
+        angle = min(spacing_km / earth_radius_km, np.pi)
+        self.chord_km = 2 * earth_radius_km * np.sin(angle / 2)
+        self.cubes = {}
+
+    def _key(self, point):
+        return tuple(int(np.floor(coordinate / self.chord_km)) for coordinate in point)
+
+    def is_clear(self, point):
+        """
+        Check that no chosen site lies within the spacing of a point.
+
+        Parameters:
+        - point: (x, y, z) position of the candidate in km, from surface_points.
+
+        Returns:
+        - True if the point is at least the spacing away from every chosen site.
+        """
+        x, y, z = self._key(point)
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                for dz in (-1, 0, 1):
+                    for other in self.cubes.get((x + dx, y + dy, z + dz), ()):
+                        if (point[0] - other[0]) ** 2 + (point[1] - other[1]) ** 2 + (point[2] - other[2]) ** 2 < self.chord_km ** 2:
+                            return False
+        return True
+
+    def add(self, point):
+        self.cubes.setdefault(self._key(point), []).append(point)
+
+def surface_points(lat, lon):
+    """
+    Convert coordinates in degrees to 3D points on the sphere, in km.
+
+    Returns:
+    - Array of shape (n, 3).
+    """
+    phi = np.radians(np.asarray(lat, dtype=np.float64))
+    lam = np.radians(np.asarray(lon, dtype=np.float64))
+    return earth_radius_km * np.column_stack([np.cos(phi) * np.cos(lam), np.cos(phi) * np.sin(lam), np.sin(phi)])
+
+# Section 2: Spaced Selection
+
+def spaced_top_k_indices(values, lat, lon, k, spacing_km):
+    """
+    Find the positions of the k best sites that are at least a given distance apart.
+
+    Parameters:
+    - values: 1D array of ranking scores (NaN values must be masked out beforehand).
+    - lat, lon: Coordinates of every position in degrees.
+    - k: Number of positions to return.
+    - spacing_km: Minimum great-circle distance between two returned sites, or None
+                  (or 0) to allow adjacent sites.
+
+    Returns:
+    - Integer array of at most k positions, ordered by descending value.
+
+    The positions are walked in descending order of value, ties broken by position as
+    in top_k_indices, and a candidate is rejected when a chosen site lies within the
+    spacing. The order is extended lazily, in batches that double, so the work depends
+    on the number of candidates examined rather than on the size of the domain.
+    """
+    if not spacing_km:
+        return top_k_indices(values, k)
+    values = np.asarray(values).ravel()
+    lat, lon = np.asarray(lat).ravel(), np.asarray(lon).ravel()
+    k = min(int(k), values.size)
+
+    chosen = []
+    site_hash = SiteHash(spacing_km)
+    ranked = np.empty(0, dtype=np.intp)
+    examined = 0
+    while len(chosen) < k:
+        if examined == ranked.size:
+            if ranked.size >= values.size:
+                break
+            # Rankings from top_k_indices are prefixes of one order, so the walk resumes where it stopped
+            ranked = top_k_indices(values, max(4 * k, 2 * ranked.size))
+            points = surface_points(lat[ranked[examined:]], lon[ranked[examined:]]).tolist()
+            first_point = examined
+        position = ranked[examined]
+        point = points[examined - first_point]
+        examined += 1
+        if site_hash.is_clear(point):
+            site_hash.add(point)
+            chosen.append(position)
+    return np.asarray(chosen, dtype=np.intp)
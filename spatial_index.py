@@ -0,0 +1,133 @@
+import numpy as np
+from city_distance import haversine_radians, earth_radius_km
+
+# Section 1: Constants
+
+# Size of the buckets of the index in degrees. Roughly 110 km of latitude, so a
+# radius of a few hundred kilometres only touches a handful of bucket rows.
+default_bucket_degrees = 1.0
+
+# Kilometres per degree of latitude on the sphere used for the distances.
+km_per_degree = np.pi * earth_radius_km / 180
+
+# Section 2: Bucket Grid Index
+
+class CellGrid:
+    """
+    Lat/lon bucket grid over a set of points, for radius and nearest-neighbour queries.
+
+    The points are sorted by bucket once, so the points of a bucket are one contiguous
+    slice. A query gathers the slices of the buckets its search window overlaps and
+    only computes great-circle distances for those points, so its cost depends on the
+    number of points near the query location rather than on the whole domain.
+    Longitudes wrap around the antimeridian.
+    """
+
+    def __init__(self, lat, lon, bucket_degrees=default_bucket_degrees):
+        """
+        Parameters:
+        - lat, lon: 1D arrays of point coordinates in degrees.
+        - bucket_degrees: Size of a bucket in degrees of latitude and longitude.
+        """
+        self.lat = np.asarray(lat, dtype=np.float64).ravel()
+        self.lon = np.asarray(lon, dtype=np.float64).ravel()
+        self.bucket_degrees = float(bucket_degrees)
+        self.rows = int(np.ceil(180 / self.bucket_degrees))
+        self.columns = int(np.ceil(360 / self.bucket_degrees))
+
+        buckets = self._row(self.lat) * self.columns + self._column(self.lon)
+        self.order = np.argsort(buckets, kind='stable')
+        # starts[b]:starts[b + 1] is the slice of self.order holding bucket b
+        self.starts = np.zeros(self.rows * self.columns + 1, dtype=np.int64)
+        np.cumsum(np.bincount(buckets, minlength=self.rows * self.columns), out=self.starts[1:])
+        # Coordinates in bucket order and in radians, so a bucket's points are read as one
+        # contiguous slice and the distances skip the conversions
+        self.bucket_phi = np.radians(self.lat[self.order])
+        self.bucket_lambda = np.radians(self.lon[self.order])
+        self.bucket_cos_phi = np.cos(self.bucket_phi)
+
+    def __len__(self):
+        return self.lat.size
+
+    def _row(self, lat):
+        return np.clip(((np.asarray(lat) + 90) // self.bucket_degrees).astype(np.int64), 0, self.rows - 1)
+
+    def _column(self, lon):
+        return ((np.asarray(lon) % 360) // self.bucket_degrees).astype(np.int64) % self.columns
+
+    def _window(self, lat, lon, radius_km):
+        """
+        Return the bucket-order indices of the points in the buckets that a circle around (lat, lon) can reach.
+        """
+        radius_degrees = radius_km / km_per_degree
+        first_row = int(self._row(max(lat - radius_degrees, -90.0)))
+        last_row = int(self._row(min(lat + radius_degrees, 90.0)))
+
+        # The circle is widest in longitude at its edge closest to a pole
+        edge_latitude = min(abs(lat) + radius_degrees, 90.0)
+        cos_edge = np.cos(np.radians(edge_latitude))
+        if cos_edge <= 0 or radius_degrees / cos_edge >= 180:
+            columns = np.arange(self.columns)
+        else:
+            half_width = radius_degrees / cos_edge
+            first_column = int(np.floor((lon - half_width) % 360 / self.bucket_degrees))
+            span = int(np.ceil(2 * half_width / self.bucket_degrees)) + 1
+            columns = (first_column + np.arange(min(span, self.columns))) % self.columns
+
+        buckets = (np.arange(first_row, last_row + 1)[:, None] * self.columns + columns[None, :]).ravel()
+        starts, stops = self.starts[buckets], self.starts[buckets + 1]
+        nonempty = stops > starts
+        if not nonempty.any():
+            return np.empty(0, dtype=np.int64)
+        starts, stops = starts[nonempty], stops[nonempty]
+        # Concatenate the slices of every bucket without a Python loop
+        lengths = stops - starts
+        offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+        return offsets + np.arange(lengths.sum())
+
+    def within(self, lat, lon, radius_km):
+        """
+        Find the points within a great-circle distance of a location.
+
+        Parameters:
+        - lat, lon: Query location in degrees.
+        - radius_km: Search radius in kilometres.
+
+        Returns:
+        - Tuple (positions, distances) of the matching points, ordered by position so
+          that rankings over them break ties the same way as over the full arrays.
+        """
+        window = self._window(float(lat), float(lon), float(radius_km))
+        phi = np.radians(float(lat))
+        distances = haversine_radians(phi, np.radians(float(lon)), np.cos(phi),
+                                      self.bucket_phi[window], self.bucket_lambda[window], self.bucket_cos_phi[window])
+        within = distances <= radius_km
+        positions = self.order[window[within]]
+        order = np.argsort(positions)
+        return positions[order], distances[within][order]
+
+    def nearest(self, lat, lon, k):
+        """
+        Find the k points closest to a location.
+
+        Parameters:
+        - lat, lon: Query location in degrees.
+        - k: Number of points to return.
+
+        Returns:
+        - Tuple (positions, distances) of at most k points, ordered by increasing distance.
+
+        The search radius starts at one bucket and doubles until it holds k points; every
+        point within the final radius has been seen, so the k closest are exact.
+        """
+        k = min(int(k), len(self))
+        if k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        radius_km = self.bucket_degrees * km_per_degree
+        while True:
+            positions, distances = self.within(lat, lon, radius_km)
+            if positions.size >= k or radius_km >= np.pi * earth_radius_km:
+                break
+            radius_km *= 2
+        order = np.lexsort((positions, distances))[:k]
+        return positions[order], distances[order]
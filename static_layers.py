@@ -0,0 +1,218 @@
+import json
+import os
+import numpy as np
+import xarray as xr
+from regridder import cached_regridder
+
+# Section 1: Cache Layout
+
+# The cache directory holds one .npy file per variable or coordinate of every layer,
+# plus a manifest that records how to rebuild the xarray Datasets and which source
+# files the cache was built from.
+manifest_file_name = 'manifest.json'
+cache_format_version = 1
+
+def source_signature(file_path):
+    """
+    Describe a source file well enough to notice when it changes.
+
+    Parameters:
+    - file_path: Path of the source file.
+
+    Returns:
+    - Dictionary with the absolute path, size and modification time of the file.
+    """
+    stat = os.stat(file_path)
+    return {'path': os.path.abspath(file_path), 'size': stat.st_size, 'mtime': stat.st_mtime}
+
+def _json_attrs(attrs):
+    """
+    Keep the attributes that can be written to the JSON manifest.
+
+    Parameters:
+    - attrs: Attribute dictionary of an xarray object.
+
+    Returns:
+    - Dictionary of JSON-serialisable attributes.
+    """
+    kept = {}
+    for key, value in attrs.items():
+        if isinstance(value, np.generic):
+            value = value.item()
+        elif isinstance(value, np.ndarray):
+            value = value.tolist()
+        try:
+            json.dumps(value)
+        except TypeError:
+            continue
+        kept[key] = value
+    return kept
+
+# Section 2: Aligning Layers to the Climate Grid
+
+def mask_layer(ds, variable):
+    """
+    Extract a mask variable with proper lat/lon coordinates.
+
+    Parameters:
+    - ds: Mask dataset as written by Raster_Layer.py.
+    - variable: Name of the mask variable ('mask' or 'airport').
+
+    Returns:
+    - DataArray of the mask with 'lat' and 'lon' index coordinates.
+
+    The airport mask stores its coordinates in 'latitude'/'longitude' variables on the
+    'lat'/'lon' dimensions, so they are promoted to index coordinates here.
+    """
+    da = ds[variable]
+    if 'lat' not in da.coords and 'latitude' in ds:
+        da = da.assign_coords(lat=ds['latitude'].values)
+    if 'lon' not in da.coords and 'longitude' in ds:
+        da = da.assign_coords(lon=ds['longitude'].values)
+    return da
+
+def align_static_layers(file_paths, mask_variables, grid_layer='orography', regrid_directory=None, method='nearest'):
+    """
+    Load the static layers and align the masks and land use to the climate grid.
+
+    Parameters:
+    - file_paths: Dictionary mapping layer names to NetCDF file paths.
+    - mask_variables: Dictionary mapping mask layer names to their variable name.
+    - grid_layer: Name of the layer whose lat/lon grid the climate data is remapped to.
+    - regrid_directory: Directory where the regridding index of each source grid is persisted.
+    - method: Regridding method of the binary masks, 'nearest' or 'area'.
+
+    Returns:
+    - Dictionary of in-memory xarray Datasets on the climate grid.
+
+    Only the binary masks in mask_variables use method. Every other layer, such as
+    the categorical land use classes, is regridded with 'nearest', since averaging
+    class codes would produce classes that do not exist.
+
+    Layers already on the climate grid are kept as they are. Every other layer is
+    aligned through a precomputed regridding index, so masks that share a grid reuse
+    one mapping and each alignment is a single gather.
+    """
+    layers = {}
+    for name, file_path in file_paths.items():
+        with xr.open_dataset(file_path) as ds:
+            layers[name] = ds.load()
+        if name in mask_variables:
+            layers[name] = xr.Dataset({mask_variables[name]: mask_layer(layers[name], mask_variables[name])})
+
+    grid_lat = layers[grid_layer]['lat'].values
+    grid_lon = layers[grid_layer]['lon'].values
+    for name, ds in layers.items():
+        if np.array_equal(ds['lat'].values, grid_lat) and np.array_equal(ds['lon'].values, grid_lon):
+            continue
+        layer_method = method if name in mask_variables else 'nearest'
+        regridder = cached_regridder(regrid_directory, ds['lat'].values, ds['lon'].values, grid_lat, grid_lon, layer_method)
+        layers[name] = regridder.regrid_dataset(ds)
+
+    return layers
+
+# Section 3: Writing and Reading the Memory-Mapped Cache
+
+def write_layer_cache(cache_directory, layers, sources):
+    """
+    Write aligned layers to the cache directory as .npy files.
+
+    Parameters:
+    - cache_directory: Directory of the cache.
+    - layers: Dictionary of xarray Datasets to store.
+    - sources: Dictionary of source signatures recorded in the manifest.
+    """
+    os.makedirs(cache_directory, exist_ok=True)
+    manifest = {'version': cache_format_version, 'sources': sources, 'layers': {}}
+
+    for name, ds in layers.items():
+        entry = {'attrs': _json_attrs(ds.attrs), 'coords': {}, 'data_vars': {}}
+        for kind, items in (('coords', ds.coords.items()), ('data_vars', ds.data_vars.items())):
+            for var_name, da in items:
+                file_name = f"{name}.{var_name}.npy"
+                np.save(os.path.join(cache_directory, file_name), np.ascontiguousarray(da.values), allow_pickle=True)
+                entry[kind][var_name] = {'file': file_name, 'dims': list(da.dims), 'attrs': _json_attrs(da.attrs)}
+        manifest['layers'][name] = entry
+
+    # Write the manifest last so a partially written cache is never considered current
+    manifest_path = os.path.join(cache_directory, manifest_file_name)
+    with open(manifest_path + '.tmp', 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(manifest_path + '.tmp', manifest_path)
+
+def read_layer_cache(cache_directory):
+    """
+    Open the cached layers as read-only memory-mapped xarray Datasets.
+
+    Parameters:
+    - cache_directory: Directory of the cache.
+
+    Returns:
+    - Dictionary of xarray Datasets backed by memory-mapped arrays.
+
+    The arrays are mapped from the page cache rather than copied, so every worker
+    process that opens the cache shares the same physical memory.
+    """
+    with open(os.path.join(cache_directory, manifest_file_name)) as f:
+        manifest = json.load(f)
+
+    def load_array(file_name):
+        path = os.path.join(cache_directory, file_name)
+        try:
+            return np.load(path, mmap_mode='r')
+        except ValueError:
+            # Object arrays cannot be memory-mapped
+            return np.load(path, allow_pickle=True)
+
+    layers = {}
+    for name, entry in manifest['layers'].items():
+        coords = {
+            var_name: xr.Variable(item['dims'], load_array(item['file']), item['attrs'])
+            for var_name, item in entry['coords'].items()
+        }
+        data_vars = {
+            var_name: xr.Variable(item['dims'], load_array(item['file']), item['attrs'])
+            for var_name, item in entry['data_vars'].items()
+        }
+        layers[name] = xr.Dataset(data_vars, coords=coords, attrs=entry['attrs'])
+    return layers
+
+def cache_is_current(cache_directory, sources):
+    """
+    Check whether the cache was built from the given source files.
+
+    Parameters:
+    - cache_directory: Directory of the cache.
+    - sources: Dictionary of current source signatures.
+
+    Returns:
+    - True if the manifest exists and matches the sources.
+    """
+    manifest_path = os.path.join(cache_directory, manifest_file_name)
+    if not os.path.exists(manifest_path):
+        return False
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+    return manifest.get('version') == cache_format_version and manifest.get('sources') == sources
+
+def load_static_layer_cache(cache_directory, file_paths, mask_variables, grid_layer='orography', regrid_directory=None):
+    """
+    Load the static layers from the cache, building the cache first if it is missing or stale.
+
+    Parameters:
+    - cache_directory: Directory of the cache.
+    - file_paths: Dictionary mapping layer names to NetCDF file paths.
+    - mask_variables: Dictionary mapping mask layer names to their variable name.
+    - grid_layer: Name of the layer that defines the climate grid.
+    - regrid_directory: Directory where the regridding indices are persisted.
+
+    Returns:
+    - Dictionary of memory-mapped xarray Datasets aligned to the climate grid.
+    """
+    sources = {name: source_signature(file_path) for name, file_path in file_paths.items()}
+    sources['grid_layer'] = grid_layer
+    if not cache_is_current(cache_directory, sources):
+        layers = align_static_layers(file_paths, mask_variables, grid_layer, regrid_directory)
+        write_layer_cache(cache_directory, layers, sources)
+        print(f"Static layer cache written to {cache_directory}")
+    return read_layer_cache(cache_directory)
@@ -0,0 +1,181 @@
+import argparse
+import numpy as np
+import pandas as pd
+
+# Section 1: Building Supply Curves
+
+# Demand satisfaction levels (in %) reported for every city.
+supply_thresholds = (50, 80, 100)
+
+def supply_curve(annual_production):
+    """
+    Build the cumulative supply curve of one city.
+
+    Parameters:
+    - annual_production: Distance-adjusted annual energy production (kWh) of every candidate cell.
+
+    Returns:
+    - Float64 array whose i-th entry is the energy of the i + 1 best cells together.
+    """
+    production = np.sort(np.asarray(annual_production, dtype=np.float64).ravel())[::-1]
+    return np.cumsum(production)
+
+def save_supply_curves(file_path, cities, demands, curves):
+    """
+    Store the supply curves of every city of a year in one .npz file.
+
+    Parameters:
+    - file_path: Output file.
+    - cities: City names.
+    - demands: Annual energy demand (kWh) of every city.
+    - curves: One cumulative curve per city, from supply_curve.
+
+    The curves are concatenated, and offsets[i]:offsets[i + 1] is the slice of city i.
+    """
+    offsets = np.zeros(len(curves) + 1, dtype=np.int64)
+    np.cumsum([curve.size for curve in curves], out=offsets[1:])
+    with open(file_path, 'wb') as f:
+        np.savez(
+            f,
+            cities=np.asarray(cities, dtype=str),
+            demands=np.asarray(demands, dtype=np.float64),
+            offsets=offsets,
+            cumulative=np.concatenate(curves) if curves else np.empty(0),
+        )
+
+# Section 2: Querying Supply Curves
+
+def supply_summary_fields(thresholds=supply_thresholds):
+    """
+    Return the columns of the supply curve summary, in order, mapped to their dtypes.
+    """
+    fields = {
+        'Year': object,
+        'City': object,
+        'City_Energy_Demand (kWh)': np.float64,
+        'Candidate_Cells': np.int64,
+        'Total_Annual_Energy (kWh)': np.float64,
+        'Max_Demand_Satisfaction (%)': np.float64,
+    }
+    fields.update({f'Cells_for_{threshold:g}%_Demand': np.int64 for threshold in thresholds})
+    return fields
+
+class SupplyCurves:
+    """
+    Cumulative supply curves of the cities of one scenario and year.
+
+    Each curve is the running total of the annual production of a city's candidate
+    cells, best cell first, so the number of cells needed to reach any share of the
+    demand is a binary search rather than a new ranking.
+    """
+
+    def __init__(self, file_path):
+        """
+        Parameters:
+        - file_path: File written by save_supply_curves.
+        """
+        with np.load(file_path) as curves:
+            self.cities = curves['cities']
+            self.demands = curves['demands']
+            self.offsets = curves['offsets']
+            self.cumulative = curves['cumulative']
+        self.city_index = {str(city).lower(): index for index, city in enumerate(self.cities)}
+
+    def _city(self, city):
+        if city.lower() not in self.city_index:
+            raise KeyError(f"Unknown city '{city}'")
+        return self.city_index[city.lower()]
+
+    def _curve(self, index):
+        return self.cumulative[self.offsets[index]:self.offsets[index + 1]]
+
+    def cells_needed(self, city, satisfaction):
+        """
+        Count the best cells needed to meet a share of a city's demand.
+
+        Parameters:
+        - city: City name (case-insensitive).
+        - satisfaction: Share of the annual demand to meet, in %.
+
+        Returns:
+        - Number of cells, or -1 if all candidate cells together fall short.
+        """
+        index = self._city(city)
+        return self._cells_needed(self._curve(index), self.demands[index] * satisfaction / 100)
+
+    @staticmethod
+    def _cells_needed(curve, target):
+        if target <= 0:
+            return 0
+        # First position where the running total reaches the target
+        position = int(np.searchsorted(curve, target, side='left'))
+        return position + 1 if position < curve.size else -1
+
+    def curve(self, city):
+        """
+        Return the supply curve of a city.
+
+        Parameters:
+        - city: City name (case-insensitive).
+
+        Returns:
+        - DataFrame with the number of cells, their cumulative annual energy and the
+          share of the demand it meets.
+        """
+        index = self._city(city)
+        cumulative = self._curve(index)
+        demand = self.demands[index]
+        return pd.DataFrame({
+            'Cells': np.arange(1, cumulative.size + 1),
+            'Cumulative_Annual_Energy (kWh)': cumulative,
+            'Demand_Satisfaction (%)': cumulative / demand * 100 if demand else np.nan,
+        })
+
+    def summary(self, year, thresholds=supply_thresholds):
+        """
+        Summarise the supply curve of every city.
+
+        Parameters:
+        - year: Year label written in the 'Year' column.
+        - thresholds: Demand satisfaction levels (in %) to count cells for.
+
+        Returns:
+        - DataFrame with the columns of supply_summary_fields; cell counts are -1 where
+          the demand share cannot be met.
+        """
+        rows = []
+        for index, (city, demand) in enumerate(zip(self.cities, self.demands)):
+            curve = self._curve(index)
+            total = curve[-1] if curve.size else 0.0
+            row = {
+                'Year': year,
+                'City': str(city),
+                'City_Energy_Demand (kWh)': demand,
+                'Candidate_Cells': curve.size,
+                'Total_Annual_Energy (kWh)': total,
+                'Max_Demand_Satisfaction (%)': total / demand * 100 if demand else np.nan,
+            }
+            for threshold in thresholds:
+                row[f'Cells_for_{threshold:g}%_Demand'] = self._cells_needed(curve, demand * threshold / 100)
+            rows.append(row)
+        fields = supply_summary_fields(thresholds)
+        return pd.DataFrame(rows, columns=list(fields)).astype(fields)
+
+# Section 3: Command Line Entry Point
+
+if __name__ == '__main__':
+    import wind_pipeline
+
+    parser = argparse.ArgumentParser(description='Count the best cells needed to meet the demand of a city.')
+    parser.add_argument('--scenario', required=True, help='RCP scenario, e.g. 8.5.')
+    parser.add_argument('--year', required=True, help='Year, e.g. 2075.')
+    parser.add_argument('--city', default=None, help='City to print the supply curve of; all cities are summarised otherwise.')
+    parser.add_argument('--thresholds', type=float, nargs='+', default=list(supply_thresholds), help='Demand satisfaction levels in %%.')
+    args = parser.parse_args()
+
+    curves = SupplyCurves(wind_pipeline.supply_curve_file_path(args.scenario, args.year))
+    if args.city:
+        for threshold in args.thresholds:
+            print(f"{args.city}: {curves.cells_needed(args.city, threshold)} cells for {threshold:g}% of the demand")
+    else:
+        print(curves.summary(args.year, args.thresholds).to_string(index=False))
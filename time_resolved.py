@@ -0,0 +1,105 @@
+import numpy as np
+import pandas as pd
+import xarray as xr
+from wind_kernels import wind_physics
+
+# Section 1: Streaming Settings
+
+# Climate variables streamed from the *_remap.nc files.
+stream_variables = ['sfcWind', 'ps', 'tas', 'hurs']
+default_time_chunk = 32  # Time steps read and evaluated together when no memory limit is given.
+bytes_per_cell_step = 64  # Working memory per grid cell and time step (inputs, three outputs and weights).
+
+def time_chunk_size(n_cells, memory_limit=None):
+    """
+    Choose how many time steps to evaluate at once.
+
+    Parameters:
+    - n_cells: Number of grid cells per time step.
+    - memory_limit: Working memory ceiling in bytes, or None for the default chunk.
+
+    Returns:
+    - Number of time steps per chunk (at least one).
+    """
+    if memory_limit is None:
+        return default_time_chunk
+    return max(1, int(memory_limit // (bytes_per_cell_step * max(n_cells, 1))))
+
+def timestep_hours(times):
+    """
+    Work out how many hours each time step of a series stands for.
+
+    Parameters:
+    - times: 1D array of datetime64 or cftime time stamps in ascending order.
+
+    Returns:
+    - Float array of durations in hours. Each step lasts until the next one and the
+      last step is as long as the one before it, so daily, 3-hourly or monthly data
+      and calendars without leap days are weighted correctly.
+    """
+    times = np.asarray(times)
+    if times.size < 2:
+        raise ValueError("At least two time steps are needed to work out the time step length")
+    steps = np.array([pd.Timedelta(step).total_seconds() / 3600 for step in np.diff(times)])
+    return np.append(steps, steps[-1])
+
+# Section 2: Accumulating Energy Over a Year
+
+def accumulate_energy(file_paths, friction, year, physics, time_chunk=default_time_chunk, dtype=np.float64):
+    """
+    Stream sub-annual climate data for one year and accumulate the energy of every grid cell.
+
+    Parameters:
+    - file_paths: Dictionary mapping 'sfcWind', 'ps', 'tas' and 'hurs' to *_remap.nc file paths.
+    - friction: DataArray of surface friction coefficients on (lat, lon), aligned to the
+                climate grid by nearest neighbour.
+    - year: The year to select from the files.
+    - physics: Dictionary of the wind_physics constants (reference_height, target_height,
+               turbine_area, power_coefficient, Rd, Rv, Kelvin).
+    - time_chunk: Number of time steps read and evaluated at once.
+    - dtype: Precision of the wind physics kernel.
+
+    Returns:
+    - Tuple (energy, hours, lat, lon): energy is a (lat, lon) float64 array in kWh,
+      hours is the number of hours covered by the selected time steps.
+
+    Power is computed per time step and integrated in place, so memory is bounded by
+    one time chunk whatever the length of the series. Cells with missing data
+    contribute no energy.
+    """
+    datasets = {variable: xr.open_dataset(file_paths[variable]) for variable in stream_variables}
+    try:
+        arrays = {}
+        for variable, ds in datasets.items():
+            da = ds[variable]
+            da = da.isel(time=np.flatnonzero(da['time'].dt.year.values == int(year)))
+            arrays[variable] = da.transpose('time', 'lat', 'lon')
+        reference = arrays['sfcWind']
+        if reference.sizes['time'] == 0:
+            raise ValueError(f"No time steps for {year} in {file_paths['sfcWind']}")
+        hours = timestep_hours(reference['time'].values)
+
+        n_lat, n_lon = reference.sizes['lat'], reference.sizes['lon']
+        friction = friction.reindex_like(reference.isel(time=0, drop=True), method='nearest')
+        friction = friction.transpose('lat', 'lon').values[None, :, :]
+        energy = np.zeros((n_lat, n_lon))
+
+        # The kernel outputs are allocated once and reused for every chunk
+        time_chunk = min(time_chunk, hours.size)
+        buffers = tuple(np.empty((time_chunk, n_lat, n_lon), dtype=dtype) for _ in range(3))
+        for start in range(0, hours.size, time_chunk):
+            steps = slice(start, min(start + time_chunk, hours.size))
+            sfcWind, ps, tas, hurs = (arrays[variable][steps].values for variable in stream_variables)
+            count = sfcWind.shape[0]
+            out = tuple(buffer[:count] for buffer in buffers)
+            _, _, power = wind_physics(sfcWind, friction, ps, tas, hurs, dtype=dtype, out=out, **physics)
+
+            # Integrate power over the duration of each step (kW x h = kWh)
+            np.nan_to_num(power, copy=False)
+            power *= hours[steps, None, None]
+            energy += power.sum(axis=0)
+
+        return energy, float(hours.sum()), reference['lat'].values, reference['lon'].values
+    finally:
+        for ds in datasets.values():
+            ds.close()
@@ -0,0 +1,102 @@
+import netCDF4 as nc
+import numpy as np
+
+# Section 1: Sparse Store of the Viable Cells
+
+store_format_version = 2  # Bump when the arrays of the store change.
+
+class ViableCells:
+    """
+    Power and coordinates of the viable cells of one final file, without the excluded cells.
+
+    After the protected area, airport, urban and water exclusions, most of the grid holds
+    zero power. The viable cells are kept as flat arrays in row-major grid order, so
+    rankings over them break ties the same way as over the dense grid, and every
+    downstream stage scans only these cells.
+    """
+
+    def __init__(self, grid_lat, grid_lon, cells, power, hours=None):
+        """
+        Parameters:
+        - grid_lat, grid_lon: 1D coordinates of the full grid in degrees.
+        - cells: Flat int32 indices of the viable cells in the (lat, lon) grid, increasing.
+        - power: Power generation of every viable cell (kW).
+        - hours: Hours integrated by a time-resolved final file, whose power is the mean
+                 over every time step, or None for a yearly mean final file.
+        """
+        self.hours = hours
+        self.grid_lat = np.asarray(grid_lat)
+        self.grid_lon = np.asarray(grid_lon)
+        self.cells = np.asarray(cells, dtype=np.int32)
+        self.power = np.asarray(power)
+        rows, columns = np.divmod(self.cells, self.grid_lon.size)
+        self.lat = self.grid_lat[rows]
+        self.lon = self.grid_lon[columns]
+
+    def __len__(self):
+        return self.cells.size
+
+    @property
+    def shape(self):
+        return (self.grid_lat.size, self.grid_lon.size)
+
+    @classmethod
+    def from_grid(cls, power, lat, lon, hours=None):
+        """
+        Extract the viable cells of a dense power grid.
+
+        Parameters:
+        - power: 2D array of power on the (lat, lon) grid; cells with NaN or non-positive power are dropped.
+        - lat, lon: 1D grid coordinates in degrees.
+        - hours: Hours integrated by a time-resolved final file, or None.
+
+        Returns:
+        - ViableCells instance.
+        """
+        power = np.asarray(power)
+        cells = np.flatnonzero(power > 0)
+        return cls(lat, lon, cells.astype(np.int32), power.ravel()[cells], hours)
+
+    @classmethod
+    def from_final_file(cls, file_path):
+        """
+        Extract the viable cells of a final file.
+
+        Returns:
+        - ViableCells instance, with the power in the precision of the file.
+        """
+        with nc.Dataset(file_path) as dataset:
+            lat = np.asarray(dataset.variables['lat'][:])
+            lon = np.asarray(dataset.variables['lon'][:])
+            power = dataset.variables['power_generation'][:, :, 0].filled(np.nan)
+            # Time-resolved final files store the annual energy and the hours it covers
+            hours = float(dataset.variables['annual_energy'].hours) if 'annual_energy' in dataset.variables else None
+        return cls.from_grid(power, lat, lon, hours)
+
+    def save(self, file_path):
+        # Write through a file object so np.savez does not append a second extension
+        with open(file_path, 'wb') as f:
+            np.savez(f, grid_lat=self.grid_lat, grid_lon=self.grid_lon, cells=self.cells, power=self.power, lat=self.lat, lon=self.lon,
+                     hours=np.nan if self.hours is None else self.hours)
+
+    @classmethod
+    def load(cls, file_path):
+        with np.load(file_path) as store:
+            viable = cls.__new__(cls)
+            for name in ('grid_lat', 'grid_lon', 'cells', 'power', 'lat', 'lon'):
+                setattr(viable, name, store[name])
+            viable.hours = None if np.isnan(store['hours']) else float(store['hours'])
+        return viable
+
+    def gather(self, values):
+        """
+        Gather the values of the viable cells from an array on the full grid.
+
+        Parameters:
+        - values: Array whose last two dimensions are the (lat, lon) grid, e.g. a city's distance cube slice.
+
+        Returns:
+        - Array of the values at the viable cells.
+        """
+        values = np.asarray(values)
+        return values.reshape(values.shape[:-2] + (-1,))[..., self.cells]
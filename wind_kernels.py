@@ -0,0 +1,228 @@
+import numpy as np
+import xarray as xr
+
+# numexpr evaluates each expression in cache-sized blocks without full-grid
+# temporaries; without it the kernel falls back to blocked NumPy.
+try:
+    import numexpr
+except ImportError:
+    numexpr = None
+
+# Section 1: Kernel Settings
+
+default_block_cells = 65536  # Grid cells per block in the NumPy fallback, small enough to stay in cache.
+kernel_tolerances = {'float64': 1e-12, 'float32': 1e-5}  # Maximum relative error against the reference functions, per dtype.
+saturation_pressure = 610.94  # Saturation vapour pressure at 0 °C in Pascals (6.1094 hPa).
+
+# Expressions of the numexpr path. The vapour pressure is written to the air density
+# output first, so the exponential is evaluated once per cell.
+wind_expression = 'sfcWind * (log(target_height / friction) / log(reference_height / friction))'
+vapour_expression = 'hurs * (saturation_pressure / 100) * exp(17.625 * (tas - Kelvin) / (tas - Kelvin + 243.04))'
+density_expression = '(ps - e * (1 - Rd / Rv)) / (Rd * tas)'
+power_expression = 'air_density * wind_80m * wind_80m * wind_80m * (0.5 * turbine_area * power_coefficient / 1000)'
+
+# Section 2: The Fused Kernel
+
+def wind_physics(sfcWind, friction, ps, tas, hurs, reference_height, target_height, turbine_area, power_coefficient,
+                 Rd, Rv, Kelvin, dtype=np.float64, out=None, block_cells=default_block_cells, backend=None):
+    """
+    Compute wind speed at hub height, air density and power generation in one pass.
+
+    Parameters:
+    - sfcWind: Wind speed at the reference height (m/s).
+    - friction: Surface friction coefficient.
+    - ps: Surface pressure in Pascals.
+    - tas: Air temperature in Kelvin.
+    - hurs: Relative humidity in percentage.
+    - reference_height, target_height: Measurement and hub heights in meters.
+    - turbine_area: Area covered by the wind turbine in square meters.
+    - power_coefficient: Power coefficient of the turbine.
+    - Rd, Rv: Specific gas constants of dry air and water vapour (J/kg·K).
+    - Kelvin: Conversion constant from Celsius to Kelvin.
+    - dtype: Precision of the computation and outputs, np.float32 or np.float64.
+    - out: Optional tuple of three preallocated output arrays of the broadcast shape.
+    - block_cells: Approximate number of grid cells per block in the NumPy fallback.
+    - backend: 'numexpr' or 'numpy'; defaults to numexpr when it is installed.
+
+    Returns:
+    - Tuple (wind_80m, air_density, power_generation) of arrays of the broadcast input shape.
+
+    Produces the same quantities as calculate_wind_at_80m, calculate_air_density and
+    calculate_power_generation in wind_pipeline, which remain the reference implementation.
+    """
+    dtype = np.dtype(dtype)
+    inputs = [np.asarray(array) for array in (sfcWind, friction, ps, tas, hurs)]
+    shape = np.broadcast_shapes(*(array.shape for array in inputs))
+    if out is None:
+        out = tuple(np.empty(shape, dtype=dtype) for _ in range(3))
+    wind_80m, air_density, power = out
+
+    constants = {
+        'reference_height': dtype.type(reference_height), 'target_height': dtype.type(target_height),
+        'turbine_area': dtype.type(turbine_area), 'power_coefficient': dtype.type(power_coefficient),
+        'Rd': dtype.type(Rd), 'Rv': dtype.type(Rv), 'Kelvin': dtype.type(Kelvin),
+        'saturation_pressure': dtype.type(saturation_pressure),
+    }
+    if backend is None:
+        backend = 'numpy' if numexpr is None else 'numexpr'
+    if backend == 'numexpr':
+        if numexpr is None:
+            raise ImportError("The numexpr backend requires numexpr; install it with 'pip install numexpr'")
+        _numexpr_kernel(inputs, wind_80m, air_density, power, constants)
+    else:
+        _numpy_kernel(inputs, shape, wind_80m, air_density, power, constants, dtype, block_cells)
+    return wind_80m, air_density, power
+
+def _numexpr_kernel(inputs, wind_80m, air_density, power, constants):
+    sfcWind, friction, ps, tas, hurs = inputs
+    evaluate = lambda expression, out, **arrays: numexpr.evaluate(
+        expression, local_dict={**constants, **arrays}, out=out, casting='same_kind')
+
+    evaluate(wind_expression, wind_80m, sfcWind=sfcWind, friction=friction)
+    evaluate(vapour_expression, air_density, tas=tas, hurs=hurs)
+    evaluate(density_expression, air_density, ps=ps, tas=tas, e=air_density)
+    evaluate(power_expression, power, air_density=air_density, wind_80m=wind_80m)
+
+def _numpy_kernel(inputs, shape, wind_80m, air_density, power, constants, dtype, block_cells):
+    # Blocks run along the first axis; every temporary is one block in size and reused
+    if not shape:
+        shape, inputs = (1,), [array.reshape(1) for array in inputs]
+        wind_80m, air_density, power = (array.reshape(1) for array in (wind_80m, air_density, power))
+    inputs = [np.broadcast_to(array, shape) for array in inputs]
+    row_cells = int(np.prod(shape[1:]))
+    rows = max(1, block_cells // max(row_cells, 1))
+    scratch = np.empty((min(rows, shape[0]),) + tuple(shape[1:]), dtype=dtype)
+    c = constants
+
+    for start in range(0, shape[0], rows):
+        block = slice(start, start + rows)
+        sfcWind, friction, ps, tas, hurs = (np.asarray(array[block], dtype=dtype) for array in inputs)
+        wind, density, out_power = wind_80m[block], air_density[block], power[block]
+        temporary = scratch[:wind.shape[0]]
+
+        # Wind speed at hub height from the logarithmic wind profile
+        np.divide(c['target_height'], friction, out=wind)
+        np.log(wind, out=wind)
+        np.divide(c['reference_height'], friction, out=temporary)
+        np.log(temporary, out=temporary)
+        np.divide(wind, temporary, out=wind)
+        np.multiply(wind, sfcWind, out=wind)
+
+        # Vapour pressure, then air density of the moist air
+        np.subtract(tas, c['Kelvin'], out=temporary)
+        np.multiply(temporary, 17.625, out=density)
+        np.add(temporary, 243.04, out=temporary)
+        np.divide(density, temporary, out=density)
+        np.exp(density, out=density)
+        np.multiply(density, hurs, out=density)
+        np.multiply(density, c['saturation_pressure'] / 100, out=density)
+        np.multiply(density, -(1 - c['Rd'] / c['Rv']), out=density)
+        np.add(density, ps, out=density)
+        np.multiply(tas, c['Rd'], out=temporary)
+        np.divide(density, temporary, out=density)
+
+        # Power of a single turbine in kilowatts
+        np.multiply(wind, wind, out=out_power)
+        np.multiply(out_power, wind, out=out_power)
+        np.multiply(out_power, density, out=out_power)
+        np.multiply(out_power, 0.5 * c['turbine_area'] * c['power_coefficient'] / 1000, out=out_power)
+
+# Section 3: Applying the Kernel to a Dataset
+
+def _dimension_order(*arrays):
+    """
+    Order the dimensions of several DataArrays by first appearance, as xarray arithmetic broadcasts them.
+    """
+    dims = []
+    for array in arrays:
+        dims.extend(dim for dim in array.dims if dim not in dims)
+    return dims
+
+def fused_wind_physics(ds, reference_height, target_height, turbine_area, power_coefficient, Rd, Rv, Kelvin, dtype=np.float64,
+                       backend=None):
+    """
+    Apply the fused kernel to a merged dataset.
+
+    Parameters:
+    - ds: Dataset holding 'sfcWind', 'friction_coefficient', 'ps', 'tas' and 'hurs'.
+    - reference_height, target_height, turbine_area, power_coefficient, Rd, Rv, Kelvin: Model constants (see wind_physics).
+    - dtype: Precision of the computation and outputs, np.float32 or np.float64.
+    - backend: 'numexpr' or 'numpy', or None for the default (see wind_physics).
+
+    Returns:
+    - Tuple (wind_80m, air_density, power_generation) of DataArrays with the same dimensions
+      as the reference functions produce. Dask-backed inputs are evaluated lazily per chunk.
+    """
+    sfcWind, friction, ps, tas, hurs = (ds[name] for name in ('sfcWind', 'friction_coefficient', 'ps', 'tas', 'hurs'))
+    wind_dims = _dimension_order(sfcWind, friction)
+    density_dims = _dimension_order(ps, hurs, tas)
+    power_dims = _dimension_order(ps, hurs, tas, sfcWind, friction)
+
+    outputs = xr.apply_ufunc(
+        wind_physics, sfcWind, friction, ps, tas, hurs,
+        kwargs={
+            'reference_height': reference_height, 'target_height': target_height, 'turbine_area': turbine_area,
+            'power_coefficient': power_coefficient, 'Rd': Rd, 'Rv': Rv, 'Kelvin': Kelvin, 'dtype': dtype,
+            'backend': backend,
+        },
+        output_core_dims=[[], [], []],
+        dask='parallelized',
+        output_dtypes=[dtype] * 3,
+    )
+
+    # Every output spans all input dimensions; drop the ones a quantity does not depend on
+    results = []
+    for output, dims in zip(outputs, (wind_dims, density_dims, power_dims)):
+        output = output.isel({dim: 0 for dim in output.dims if dim not in dims}, drop=True)
+        results.append(output.transpose(*dims))
+    return tuple(results)
+
+# Section 4: Checking the Kernel Against the Reference
+
+def check_kernel(shape=(361, 720), seed=0):
+    """
+    Compare the fused kernel with the reference functions of wind_pipeline on a random grid.
+
+    Parameters:
+    - shape: (lat, lon) size of the random grid.
+    - seed: Random seed of the grid.
+
+    Returns:
+    - Dictionary mapping (backend, dtype, quantity) to the maximum relative error.
+
+    Every available backend, including the NumPy fallback, is checked in float64 and
+    float32. Raises RuntimeError when a result has other dimensions than the reference
+    or an error above kernel_tolerances.
+    """
+    import wind_pipeline as wp
+    rng = np.random.default_rng(seed)
+    grid = xr.Dataset({
+        'sfcWind': (('lat', 'lon'), rng.uniform(0, 20, shape).astype(np.float32)),
+        'friction_coefficient': (('time', 'lat', 'lon'), rng.uniform(0.0002, 1.5, (1,) + tuple(shape))),
+        'ps': (('lat', 'lon'), rng.uniform(90000, 104000, shape).astype(np.float32)),
+        'tas': (('lat', 'lon'), rng.uniform(240, 315, shape).astype(np.float32)),
+        'hurs': (('lat', 'lon'), rng.uniform(0, 100, shape).astype(np.float32)),
+    })
+    reference_wind = wp.calculate_wind_at_80m(grid['sfcWind'].astype(np.float64), grid['friction_coefficient'], wp.reference_height, wp.target_height)
+    reference_density = wp.calculate_air_density(grid['ps'].astype(np.float64), grid['tas'].astype(np.float64), grid['hurs'].astype(np.float64), wp.Rd, wp.Rv, wp.Kelvin)
+    reference_power = wp.calculate_power_generation(reference_wind, reference_density, wp.turbine_area, wp.power_coefficient)
+    references = {'wind_80m': reference_wind, 'air_density': reference_density, 'power_generation': reference_power}
+
+    errors = {}
+    backends = ['numpy'] if numexpr is None else ['numexpr', 'numpy']
+    for backend in backends:
+        for dtype in (np.float64, np.float32):
+            fused = fused_wind_physics(grid, wp.reference_height, wp.target_height, wp.turbine_area, wp.power_coefficient,
+                                       wp.Rd, wp.Rv, wp.Kelvin, dtype, backend)
+            for (name, reference), result in zip(references.items(), fused):
+                if set(result.dims) != set(reference.dims):
+                    raise RuntimeError(f"The {backend} kernel gives {name} dims {result.dims}, the reference {reference.dims}")
+                error = float(np.nanmax(np.abs(result - reference) / np.abs(reference).clip(1e-12)))
+                if not error <= kernel_tolerances[np.dtype(dtype).name]:
+                    raise RuntimeError(f"The {backend} kernel in {np.dtype(dtype).name} gives {name} with a relative error of {error:.2e}")
+                errors[(backend, np.dtype(dtype).name, name)] = error
+    return errors
+
+if __name__ == '__main__':
+    for (backend, dtype, name), error in check_kernel().items():
+        print(f"{backend} {dtype} {name}: max relative error {error:.2e}")
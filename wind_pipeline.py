@@ -0,0 +1,1103 @@
+# Section 1: Imports and Setup
+
+# Subsection 1.1: Importing Required Libraries
+import xarray as xr
+import numpy as np
+import os
+import pandas as pd
+from site_spacing import spaced_top_k_indices
+from static_layers import load_static_layer_cache
+from exclusion_mask import prepare_exclusion_mask
+from build_cache import stage_signature, is_up_to_date, record_stamp
+from wind_kernels import fused_wind_physics
+from time_resolved import accumulate_energy, time_chunk_size
+from turbines import load_turbine_catalog, turbine_power
+from instrumentation import stage
+from results_builder import ResultColumns
+from spatial_index import CellGrid
+from geometry_cache import cached_city_geometry
+from site_allocation import allocate_sites, allocation_fields
+from supply_curve import supply_curve, save_supply_curves, SupplyCurves, supply_summary_fields
+from results_store import result_schema, write_results, read_results, dataset_directory
+from site_exports import export_sites
+from viable_cells import ViableCells, store_format_version
+
+# Dask is only needed for the chunked execution mode.
+try:
+    import dask
+except ImportError:
+    dask = None
+
+# Subsection 1.2: Directory Setup
+# Define the base directory for the project and subdirectories for shared data categories.
+base_directory = os.environ.get('WINDSIGHT_BASE_DIRECTORY', '/Users/jamesquessy/Developer/Projects/Masters')
+population_directory = os.path.join(base_directory, 'Data/Population')
+raster_file_directory = os.path.join(base_directory, 'Data/Raster_Data/Raw_Data')
+
+# Define file paths for orography, land area, and land use data.
+orography_file_path = os.path.join(base_directory, 'Data/Raster_Data/Orogrophy/orography_remap.nc')
+land_area_file_path = os.path.join(base_directory, 'Data/Raster_Data/Land_Area/land_area_remap.nc')
+land_use_file_path = os.path.join(base_directory, 'Data/Raster_Data/land_use/remaped_land.nc')
+
+# Define file paths for raster files.
+airport_mask_file_path = os.path.join(raster_file_directory, 'airport_mask.nc')
+spa_mask_file_path = os.path.join(raster_file_directory, 'spa_raster_NetCDF.nc')
+nsa_mask_file_path = os.path.join(raster_file_directory, 'nsa_raster_NetCDF.nc')
+
+# Define the file path of the combined exclusion bitmask built from the masks and land use.
+exclusion_mask_file_path = os.path.join(raster_file_directory, 'exclusion_mask.nc')
+
+# Directory of the memory-mapped cache of static layers aligned to the climate grid.
+static_cache_directory = os.path.join(base_directory, 'Data/Static_Cache')
+
+# Directory of the persisted regridding indices between the mask grids and the climate grid.
+regrid_directory = os.path.join(static_cache_directory, 'regrid')
+# Directory of the memory-mapped city-to-cell distance and loss factor cubes, shared by every scenario and year.
+geometry_cache_directory = os.path.join(static_cache_directory, 'geometry')
+mask_regrid_method = 'nearest'  # 'nearest', or 'area' to mark cells partially covered by a mask.
+
+# Catalog of turbine models (hub height, cut-in/rated/cut-out speeds and power curve) shipped with the code.
+turbine_catalog_file_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'turbine_catalog.json')
+
+# Directory of the partitioned Parquet result datasets shared by every scenario.
+results_directory = os.path.join(base_directory, 'Results')
+
+# Static inputs shared by every year and scenario, and the variable holding each exclusion mask.
+static_layer_file_paths = {
+    'orography': orography_file_path,
+    'land_area': land_area_file_path,
+    'land_use': land_use_file_path,
+    'nsa_mask': nsa_mask_file_path,
+    'airport_mask': airport_mask_file_path,
+    'spa_mask': spa_mask_file_path,
+}
+mask_variables = {'nsa_mask': 'mask', 'airport_mask': 'airport', 'spa_mask': 'mask'}
+
+# Layers kept in the static layer cache; the individual masks are replaced by the exclusion bitmask.
+cached_layer_file_paths = {
+    'orography': orography_file_path,
+    'land_area': land_area_file_path,
+    'land_use': land_use_file_path,
+    'exclusion': exclusion_mask_file_path,
+}
+
+def scenario_directories(scenario):
+    """
+    Build (and create if needed) the directories used by one RCP scenario.
+
+    Parameters:
+    - scenario: RCP scenario label, e.g. '2.6', '4.5' or '8.5'.
+
+    Returns:
+    - Dictionary with the 'remap', 'last_year_avg', 'merged', 'final_files' and 'code' directories.
+    """
+    directories = {
+        'remap': os.path.join(base_directory, f'Data/NetCDF_Files/RCP_{scenario}'),
+        'last_year_avg': os.path.join(base_directory, f'Data/last_year_avg/RCP_{scenario}'),
+        'merged': os.path.join(base_directory, f'RCP_{scenario}/Code/Merged_Files'),
+        'final_files': os.path.join(base_directory, f'RCP_{scenario}/Code/final_files'),
+        'code': os.path.join(base_directory, f'RCP_{scenario}/Code'),
+    }
+
+    # Ensure that all the necessary directories exist
+    for directory in [population_directory, raster_file_directory, *directories.values()]:
+        os.makedirs(directory, exist_ok=True)
+
+    return directories
+
+
+# Subsection 1.3: Define Constants for the Model
+# Define scenarios and years for analysis and variables for climate data.
+scenarios = ['2.6', '4.5', '8.5']
+years = ['2020', '2050', '2075', '2099']
+variables = ['hurs', 'ps', 'sfcWind', 'tas']
+
+# Constants related to wind turbine calculations.
+turbine_area = 2000  # Turbine area in square meters.
+power_coefficient = 0.35  # Turbine power coefficient.
+reference_height = 10  # Reference height for wind speed measurement (in meters).
+target_height = 80  # Target height for wind speed estimation (in meters).
+
+# Physical constants and other parameters for environmental calculations.
+Rd = 287.05  # Specific gas constant for dry air (J/kg·K).
+Rv = 461.5  # Specific gas constant for water vapor (J/kg·K).
+Kelvin = 273.15  # Conversion constant from Celsius to Kelvin.
+power_loss_per_1000km = 0.0035  # Fractional power loss per 1000 km.
+days_per_year = 365  # Number of days per year.
+hours_per_year = 8760  # Number of hours in a non-leap year.
+air_density = 1.225  # Air density at sea level (kg/m³).
+swept_area = 2000  # Area swept by wind turbine blades (m²).
+rated_wind_speed = 14  # Rated wind speed for turbine power calculations (m/s).
+assumed_capacity_factor = 0.3  # Share of the day a turbine is assumed to generate when estimating annual energy.
+physics_dtype = np.float64  # Precision of the fused wind physics kernel; np.float32 halves its memory.
+top_k = 10  # Default number of ranked locations reported per city and per year.
+max_transmission_km = None  # Only rank cells within this distance of a city (in km); None ranks the whole domain.
+site_spacing_km = None  # Minimum distance between two ranked sites (in km); None allows adjacent cells.
+allocation_radius_km = 500  # Search radius of the competitive site allocation when max_transmission_km is None (in km).
+
+# Chunked execution mode for large or high-resolution grids.
+chunked_threads = 1  # Dask threads per worker process; the memory limit is shared between them.
+chunked_bytes_per_cell = 256  # Working memory per grid cell while merging (about 32 float64 values).
+
+# Variables that are not needed after the merge step.
+dropped_variables = [
+    "air_density", "change_count", 'friction_coefficient', 'hurs',
+    'current_pixel_state', 'observation_count', 'orog', 'processed_flag',
+    'ps', 'sfcWind', 'sftlf', 'tas', 'time', 'time_bnds', 'wind_80m'
+]
+
+# Section 2: Static Input Layers
+
+# Static layers loaded once per process, keyed by name.
+_static_layers = {}
+
+def load_static_layers():
+    """
+    Load the orography, land area, land use and exclusion bitmask datasets.
+
+    These inputs are identical for every year and scenario. The first call in a run
+    builds the exclusion bitmask if needed and writes the layers to the static layer cache; every
+    process then maps the cached arrays read-only, so worker processes share one copy
+    in the page cache. The result is kept per process and reused by every merge.
+
+    Returns:
+    - Dictionary of xarray Datasets backed by memory-mapped arrays.
+    """
+    if not _static_layers:
+        with stage('static_layers'):
+            prepare_exclusion_mask(exclusion_mask_file_path, static_layer_file_paths, mask_variables,
+                                   regrid_directory=regrid_directory, method=mask_regrid_method)
+            _static_layers.update(load_static_layer_cache(static_cache_directory, cached_layer_file_paths, {},
+                                                          regrid_directory=regrid_directory))
+    return _static_layers
+
+def spatial_chunks(memory_limit):
+    """
+    Choose lat/lon chunk sizes that keep the merge of one chunk under a memory ceiling.
+
+    Parameters:
+    - memory_limit: Working memory allowed per worker process (in bytes).
+
+    Returns:
+    - Dictionary of chunk sizes for the 'lat' and 'lon' dimensions.
+
+    Chunks are whole blocks of latitude rows whenever they fit, matching the on-disk
+    layout of the NetCDF files so the output is streamed in contiguous pieces.
+    """
+    if dask is None:
+        raise ImportError("Chunked execution requires dask; install it with 'pip install dask'")
+    grid = load_static_layers()['orography']
+    n_lat, n_lon = grid.sizes['lat'], grid.sizes['lon']
+    cells = max(1, int(memory_limit // (chunked_bytes_per_cell * chunked_threads)))
+    if cells >= n_lon:
+        return {'lat': min(n_lat, cells // n_lon), 'lon': n_lon}
+    return {'lat': 1, 'lon': cells}
+
+def write_netcdf(ds, file_path):
+    """
+    Write a dataset to NetCDF, streaming it chunk by chunk when it is backed by dask.
+
+    Parameters:
+    - ds: xarray Dataset, eager or chunked.
+    - file_path: Output path.
+    """
+    if dask is not None and ds.chunks:
+        with dask.config.set(scheduler='threads', num_workers=chunked_threads):
+            ds.to_netcdf(file_path)
+    else:
+        ds.to_netcdf(file_path)
+
+# Section 3: Wind Turbine Weather Analysis
+
+# Subsection 3.1: Function Definitions for Various Wind Calculations
+
+def calculate_wind_at_80m(wind_speed_10m, friction_coefficient, reference_height, target_height):
+    """
+    Calculate wind speed at 80 meters using logarithmic wind profile.
+
+    Parameters:
+    - wind_speed_10m: Wind speed measured at 10 meters.
+    - friction_coefficient: Surface friction coefficient.
+    - reference_height: The height at which the reference wind speed is measured.
+    - target_height: The height for which the wind speed is to be estimated.
+
+    Returns:
+    - Estimated wind speed at 80 meters.
+    """
+    return wind_speed_10m * (np.log(target_height / friction_coefficient) / np.log(reference_height / friction_coefficient))
+
+def calculate_saturation_vapor_pressure(t):
+    """
+    Calculate saturation vapor pressure based on temperature.
+
+    Parameters:
+    - t: Temperature in degrees Celsius.
+
+    Returns:
+    - Saturation vapor pressure in Pascals.
+    """
+    return 6.1094 * np.exp((17.625 * t) / (t + 243.04)) * 100
+
+def calculate_vapor_pressure(t, rh):
+    """
+    Calculate actual vapor pressure based on temperature and relative humidity.
+
+    Parameters:
+    - t: Temperature in degrees Celsius.
+    - rh: Relative humidity in percentage.
+
+    Returns:
+    - Actual vapor pressure in Pascals.
+    """
+    es = calculate_saturation_vapor_pressure(t)
+    return (rh / 100.0) * es
+
+def calculate_air_density(ps, tas, rh, Rd, Rv, Kelvin):
+    """
+    Calculate air density at surface level.
+
+    Parameters:
+    - ps: Surface pressure in Pascals.
+    - tas: Air temperature in Kelvin.
+    - rh: Relative humidity in percentage.
+    - Rd: Specific gas constant for dry air (J/kg·K).
+    - Rv: Specific gas constant for water vapor (J/kg·K).
+    - Kelvin: Conversion constant from Celsius to Kelvin.
+
+    Returns:
+    - Air density at the surface level in kg/m³.
+    """
+    temp_celsius = tas - Kelvin
+    e = calculate_vapor_pressure(temp_celsius, rh)
+    Pd = ps - e
+    return (Pd / (Rd * tas)) + (e / (Rv * tas))
+
+def calculate_power_generation(wind_80m, air_density, turbine_area, power_coefficient):
+    """
+    Calculate power generation for a single wind turbine.
+
+    Parameters:
+    - wind_80m: Wind speed at 80 meters.
+    - air_density: Air density in kg/m³.
+    - turbine_area: Area covered by the wind turbine in square meters.
+    - power_coefficient: Power coefficient of the turbine.
+
+    Returns:
+    - Power generation in kilowatts.
+    """
+    wind_power = 0.5 * air_density * turbine_area * (wind_80m ** 3) * power_coefficient
+    return wind_power / 1000  # Convert to kW
+
+
+# Section 4: Data Processing and Analysis
+
+def build_merged_dataset(scenario, year, chunks=None, turbines=None):
+    """
+    Merge various climate datasets for a given scenario and year and apply the exclusion masks in memory.
+
+    Parameters:
+    - scenario: The RCP scenario label.
+    - year: The year for which the datasets are to be merged.
+    - chunks: Optional spatial chunk sizes (see spatial_chunks). When given, every input
+              is opened lazily with these chunks and the physics is evaluated per chunk
+              when the result is written.
+    - turbines: Optional list of turbine names from the turbine catalog, or 'all'. When
+                given, 'turbine_power' and 'turbine_capacity_factor' are added on a
+                'turbine' dimension from the tabulated power curves.
+
+    Returns:
+    - The merged xarray Dataset.
+
+    Steps:
+    1. Take the static datasets (orography, land area, and land use) from the process cache.
+    2. Append additional climate data for the specified year.
+    3. Calculate wind speed at 80m, air density, and power generation.
+    4. Evaluate the catalog power curves of the requested turbines.
+    5. Exclude NSA, SPA, airport, urban and water cells from the power generation data.
+    """
+    directories = scenario_directories(scenario)
+    static_layers = load_static_layers()
+
+    with stage('merge', scenario=scenario, year=year):
+        # Load necessary datasets
+        datasets = [static_layers['orography'], static_layers['land_area'], static_layers['land_use']]
+        exclusion = static_layers['exclusion']['exclusion']
+        if chunks:
+            datasets = [ds.chunk(chunks) for ds in datasets]
+            exclusion = exclusion.chunk(chunks)
+
+        # Append additional climate data for the specified year
+        for variable in variables:
+            file_path = os.path.join(directories['last_year_avg'], f"{variable}_{year}_yearly_avg.nc")
+            if os.path.exists(file_path):
+                ds = xr.open_dataset(file_path, chunks=chunks)
+                if 'height' in ds:
+                    ds = ds.drop_vars('height')  # Drop 'height' variable if present
+                datasets.append(ds)
+
+        # Merge all datasets and calculate necessary parameters
+        merged_ds = xr.merge(datasets)
+        if all(name in merged_ds for name in ('sfcWind', 'friction_coefficient', 'ps', 'tas', 'hurs')):
+            # Compute wind speed, air density and power in one pass without full-grid temporaries
+            merged_ds['wind_80m'], merged_ds['air_density'], merged_ds['power_generation'] = fused_wind_physics(
+                merged_ds, reference_height, target_height, turbine_area, power_coefficient, Rd, Rv, Kelvin, physics_dtype
+            )
+        else:
+            if 'sfcWind' in merged_ds and 'friction_coefficient' in merged_ds:
+                merged_ds['wind_80m'] = calculate_wind_at_80m(
+                    merged_ds['sfcWind'], merged_ds['friction_coefficient'], reference_height, target_height
+                )
+            if 'ps' in merged_ds and 'tas' in merged_ds and 'hurs' in merged_ds:
+                merged_ds['air_density'] = calculate_air_density(
+                    merged_ds['ps'], merged_ds['tas'], merged_ds['hurs'], Rd, Rv, Kelvin
+                )
+            if 'wind_80m' in merged_ds and 'air_density' in merged_ds:
+                merged_ds['power_generation'] = calculate_power_generation(
+                    merged_ds['wind_80m'], merged_ds['air_density'], turbine_area, power_coefficient
+                )
+
+        # Evaluate every requested turbine model in one pass over the grid
+        if turbines and 'sfcWind' in merged_ds and 'friction_coefficient' in merged_ds:
+            catalog = load_turbine_catalog(turbine_catalog_file_path, None if turbines == 'all' else turbines)
+            merged_ds['turbine_power'], merged_ds['turbine_capacity_factor'] = turbine_power(
+                merged_ds['sfcWind'], merged_ds['friction_coefficient'], merged_ds.get('air_density'), catalog, reference_height
+            )
+
+    with stage('mask', scenario=scenario, year=year):
+        # The bitmask is already on the climate grid; reindexing only guards against a different merged grid
+        exclusion = exclusion.reindex_like(merged_ds['power_generation'], method='nearest')
+
+        # Apply every exclusion with a single test and keep the per-cell reasons in the output
+        merged_ds['power_generation'] = merged_ds['power_generation'].where(exclusion == 0, 0)
+        for name in ('turbine_power', 'turbine_capacity_factor'):
+            if name in merged_ds:
+                merged_ds[name] = merged_ds[name].where(exclusion == 0, 0)
+        merged_ds['exclusion'] = exclusion
+
+    return merged_ds
+
+def merge_datasets(scenario, year, chunks=None, turbines=None):
+    """
+    Merge the datasets for a given scenario and year and save them as a NetCDF file.
+
+    Parameters:
+    - scenario: The RCP scenario label.
+    - year: The year for which the datasets are to be merged.
+    - chunks: Optional spatial chunk sizes for chunked execution.
+    - turbines: Optional list of catalog turbine names, or 'all'.
+
+    Returns:
+    - The file path of the merged NetCDF dataset.
+    """
+    directories = scenario_directories(scenario)
+    merged_ds = build_merged_dataset(scenario, year, chunks, turbines)
+
+    # Save the merged dataset
+    merged_file_path = os.path.join(directories['merged'], f"Merged_{year}.nc")
+    with stage('write_merged', scenario=scenario, year=year):
+        write_netcdf(merged_ds, merged_file_path)
+    print(f"Merged file for RCP {scenario} {year} saved at {merged_file_path}")
+
+    return merged_file_path
+
+# Subsection 4.1: Post-Merge Stages
+
+def select_essential_variables(ds):
+    """
+    Drop the variables that are not needed for the city analysis.
+
+    Parameters:
+    - ds: The merged xarray Dataset.
+
+    Returns:
+    - Dataset with the essential variables only.
+    """
+    return ds.drop_vars(dropped_variables, errors='ignore')
+
+def fill_missing_values(ds):
+    """
+    Replace NaN values with zero in every floating point variable.
+
+    Parameters:
+    - ds: xarray Dataset.
+
+    Returns:
+    - Dataset without NaN values.
+    """
+    for var in ds.variables:
+        if ds[var].dtype.kind in 'f':
+            ds[var] = ds[var].fillna(0)
+    return ds
+
+# Subsection 4.2: Stage Dependencies
+
+# Bump when a code change alters the stage outputs, so that earlier builds are rebuilt.
+pipeline_version = 2
+
+def merge_inputs(scenario, year, turbines=None):
+    """
+    List the input files the merged dataset of a scenario and year depends on.
+
+    Parameters:
+    - scenario: The RCP scenario label.
+    - year: The year to process.
+    - turbines: Optional list of catalog turbine names, or 'all'.
+
+    Returns:
+    - Dictionary mapping input names to file paths.
+    """
+    directories = scenario_directories(scenario)
+    inputs = dict(static_layer_file_paths)
+    for variable in variables:
+        inputs[variable] = os.path.join(directories['last_year_avg'], f"{variable}_{year}_yearly_avg.nc")
+    if turbines:
+        inputs['turbine_catalog'] = turbine_catalog_file_path
+    return inputs
+
+def merge_parameters(turbines=None):
+    """
+    Collect the model parameters the merged dataset depends on.
+
+    Parameters:
+    - turbines: Optional list of catalog turbine names, or 'all'.
+
+    Returns:
+    - Dictionary of parameter values.
+    """
+    return {
+        'pipeline_version': pipeline_version,
+        'turbine_area': turbine_area,
+        'power_coefficient': power_coefficient,
+        'reference_height': reference_height,
+        'target_height': target_height,
+        'Rd': Rd,
+        'Rv': Rv,
+        'Kelvin': Kelvin,
+        'physics_dtype': np.dtype(physics_dtype).name,
+        'mask_regrid_method': mask_regrid_method,
+        'turbines': turbines,
+    }
+
+# Subsection 4.3: Building the Final File
+
+def prepare_final_file(scenario, year, keep_intermediate_files=False, memory_limit=None, time_resolved=False, turbines=None):
+    """
+    Produce the final power generation file for a scenario and year.
+
+    Parameters:
+    - scenario: The RCP scenario label.
+    - year: The year to process.
+    - keep_intermediate_files: Write Merged_{year}.nc and essential_var_{year}.nc
+                               between the stages (debug option).
+    - memory_limit: Working memory ceiling in bytes. None processes the whole grid
+                    in memory; a value switches to chunked (dask) execution.
+    - time_resolved: Compute power per time step from the sub-annual *_remap.nc files
+                     instead of from the yearly mean climate (see prepare_time_resolved_file).
+    - turbines: Optional list of catalog turbine names, or 'all', to add the power and
+                capacity factor of each turbine model on a 'turbine' dimension
+                (yearly mean mode only).
+
+    Returns:
+    - The file path of the final NetCDF dataset.
+
+    Steps:
+    1. Merge the datasets for the year.
+    2. Drop the variables that are not needed for the city analysis.
+    3. Replace NaN values with zero and save the final file.
+
+    Urban and water cells are excluded during the merge through the exclusion bitmask.
+
+    By default every stage runs on the same in-memory dataset and only the final
+    file is written. The output is stamped with a hash of its input files and
+    parameters, and is only rebuilt when that hash changes.
+    """
+    if time_resolved:
+        if turbines:
+            raise ValueError("Turbine catalogs are only evaluated in yearly mean mode, not with time_resolved")
+        return prepare_time_resolved_file(scenario, year, memory_limit)
+    chunks = spatial_chunks(memory_limit) if memory_limit else None
+    if keep_intermediate_files:
+        return prepare_final_file_with_intermediates(scenario, year, chunks, turbines)
+
+    directories = scenario_directories(scenario)
+    final_file_path = os.path.join(directories['final_files'], f"final_file_{year}.nc")
+    signature, details = stage_signature(merge_inputs(scenario, year, turbines), {**merge_parameters(turbines), 'dropped_variables': dropped_variables})
+    if is_up_to_date(final_file_path, signature):
+        print(f"Final file is up to date in 'final_files' directory for RCP {scenario} {year}")
+        return final_file_path
+
+    ds = build_merged_dataset(scenario, year, chunks, turbines)
+    with stage('select_essential', scenario=scenario, year=year):
+        ds = select_essential_variables(ds)
+    with stage('fill_missing', scenario=scenario, year=year):
+        ds = fill_missing_values(ds)
+    with stage('write_final', scenario=scenario, year=year):
+        write_netcdf(ds, final_file_path)
+    record_stamp(final_file_path, signature, details)
+    print(f"Final file saved in 'final_files' directory for RCP {scenario} {year}")
+
+    return final_file_path
+
+def prepare_final_file_with_intermediates(scenario, year, chunks=None, turbines=None):
+    """
+    Produce the final power generation file through the intermediate NetCDF files.
+
+    Parameters:
+    - scenario: The RCP scenario label.
+    - year: The year to process.
+    - chunks: Optional spatial chunk sizes for chunked execution.
+    - turbines: Optional list of catalog turbine names, or 'all'.
+
+    Returns:
+    - The file path of the final NetCDF dataset.
+
+    Each of the merged, essential variable and final files is stamped with the hash
+    of the stage before it, so only stale stages are recomputed.
+    """
+    directories = scenario_directories(scenario)
+
+    # Merge datasets for the given year
+    merged_file_path = os.path.join(directories['merged'], f"Merged_{year}.nc")
+    signature, details = stage_signature(merge_inputs(scenario, year, turbines), merge_parameters(turbines))
+    if is_up_to_date(merged_file_path, signature):
+        print(f"Merged file is up to date for RCP {scenario} {year}")
+    else:
+        merge_datasets(scenario, year, chunks, turbines)
+        record_stamp(merged_file_path, signature, details)
+
+    # Process and drop unnecessary variables
+    essential_var_file_path = os.path.join(directories['merged'], f"essential_var_{year}.nc")
+    signature, details = stage_signature({'merged': merged_file_path}, {'pipeline_version': pipeline_version, 'dropped_variables': dropped_variables})
+    if is_up_to_date(essential_var_file_path, signature):
+        print(f"Essential variables file is up to date for RCP {scenario} {year}")
+    else:
+        ds = xr.open_dataset(merged_file_path, chunks=chunks)
+        # Dropping variables that are not needed for further analysis
+        with stage('select_essential', scenario=scenario, year=year):
+            ds = select_essential_variables(ds)
+            # Save dataset with essential variables only
+            write_netcdf(ds, essential_var_file_path)
+        ds.close()
+        record_stamp(essential_var_file_path, signature, details)
+        print(f"Essential variables saved for RCP {scenario} {year}")
+
+    # Replace NaN values and save the final file
+    final_file_path = os.path.join(directories['final_files'], f"final_file_{year}.nc")
+    signature, details = stage_signature({'essential': essential_var_file_path}, {'pipeline_version': pipeline_version})
+    if is_up_to_date(final_file_path, signature):
+        print(f"Final file is up to date in 'final_files' directory for RCP {scenario} {year}")
+    else:
+        ds = xr.open_dataset(essential_var_file_path, chunks=chunks)
+        with stage('fill_missing', scenario=scenario, year=year):
+            ds = fill_missing_values(ds)
+            write_netcdf(ds, final_file_path)
+        ds.close()
+        record_stamp(final_file_path, signature, details)
+        print(f"All NaN Values removed and saved in 'final_files' directory for RCP {scenario} {year}")
+
+    return final_file_path
+
+# Subsection 4.4: Time-Resolved Mode
+
+def remap_file_paths(scenario, year):
+    """
+    List the sub-annual climate files of a scenario and year.
+
+    Parameters:
+    - scenario: The RCP scenario label.
+    - year: The year to process.
+
+    Returns:
+    - Dictionary mapping each climate variable to its {variable}_{year}_remap.nc path.
+    """
+    directories = scenario_directories(scenario)
+    return {variable: os.path.join(directories['remap'], f"{variable}_{year}_remap.nc") for variable in variables}
+
+def build_time_resolved_dataset(scenario, year, memory_limit=None):
+    """
+    Compute mean power, annual energy and capacity factor from daily or sub-daily climate data.
+
+    Parameters:
+    - scenario: The RCP scenario label.
+    - year: The year to process.
+    - memory_limit: Working memory ceiling in bytes used to size the time chunks, or None for the default.
+
+    Returns:
+    - Dataset with 'power_generation' (mean power in kW, laid out like the yearly-mean
+      final file), 'annual_energy' (kWh), 'capacity_factor' (%) and 'exclusion'.
+
+    Because power is cubic in wind speed, the power of the yearly mean wind speed
+    underestimates the mean power. Here power is evaluated for every time step and
+    integrated over the year instead.
+    """
+    static_layers = load_static_layers()
+    friction = static_layers['land_use']['friction_coefficient']
+    friction = friction.isel({dim: 0 for dim in friction.dims if dim not in ('lat', 'lon')}, drop=True)
+    time_chunk = time_chunk_size(friction.size, memory_limit)
+
+    physics = {
+        'reference_height': reference_height, 'target_height': target_height, 'turbine_area': turbine_area,
+        'power_coefficient': power_coefficient, 'Rd': Rd, 'Rv': Rv, 'Kelvin': Kelvin,
+    }
+    energy, hours, lat, lon = accumulate_energy(remap_file_paths(scenario, year), friction, year, physics, time_chunk, physics_dtype)
+
+    coords = {'lat': lat, 'lon': lon}
+    annual_energy = xr.DataArray(energy, dims=('lat', 'lon'), coords=coords, attrs={'units': 'kWh', 'hours': hours})
+    mean_power = annual_energy / hours
+    capacity_factor = annual_energy / (P_rated_kW * hours) * 100
+
+    # Exclude NSA, SPA, airport, urban and water cells
+    exclusion = static_layers['exclusion']['exclusion'].reindex_like(annual_energy, method='nearest')
+    available = exclusion == 0
+    ds = xr.Dataset({
+        'power_generation': mean_power.where(available, 0).expand_dims('time', axis=-1).assign_attrs(units='kW'),
+        'annual_energy': annual_energy.where(available, 0).assign_attrs(annual_energy.attrs),
+        'capacity_factor': capacity_factor.where(available, 0).assign_attrs(units='%'),
+        'exclusion': exclusion,
+    })
+    return ds
+
+def prepare_time_resolved_file(scenario, year, memory_limit=None):
+    """
+    Produce the final file of a scenario and year in time-resolved mode.
+
+    Parameters:
+    - scenario: The RCP scenario label.
+    - year: The year to process.
+    - memory_limit: Working memory ceiling in bytes used to size the time chunks.
+
+    Returns:
+    - The file path of the final NetCDF dataset, which the city analysis reads as usual.
+    """
+    directories = scenario_directories(scenario)
+    final_file_path = os.path.join(directories['final_files'], f"final_file_{year}.nc")
+    inputs = {**static_layer_file_paths, **remap_file_paths(scenario, year)}
+    signature, details = stage_signature(inputs, {**merge_parameters(), 'time_resolved': True})
+    if is_up_to_date(final_file_path, signature):
+        print(f"Time-resolved final file is up to date for RCP {scenario} {year}")
+        return final_file_path
+
+    with stage('time_resolved', scenario=scenario, year=year):
+        ds = build_time_resolved_dataset(scenario, year, memory_limit)
+    with stage('write_final', scenario=scenario, year=year):
+        ds.to_netcdf(final_file_path)
+    record_stamp(final_file_path, signature, details)
+    print(f"Time-resolved final file saved in 'final_files' directory for RCP {scenario} {year}")
+
+    return final_file_path
+
+# Section 5: City-Level Data Analysis
+
+# Calculate theoretical maximum power output at rated wind speed
+P_rated = 0.5 * air_density * swept_area * power_coefficient * rated_wind_speed**3
+P_rated_kW = P_rated / 1000  # Convert to kilowatts (kW)
+max_annual_output = P_rated_kW * hours_per_year  # Maximal annual output in kWh
+
+# Columns of the per-city and grid-wide rankings, with the dtype each is stored in.
+city_ranking_fields = {
+    'Year': object,
+    'City': object,
+    'Rank': np.int64,
+    'Lat': np.float64,
+    'Lon': np.float64,
+    'Distance_to_City (km)': np.float64,
+    'Adjusted_Daily_Power (kW)': np.float64,
+    'Annual_Energy_Production (kWh)': np.float64,
+    'City_Energy_Demand (kWh)': np.float64,
+    'Demand_Satisfaction (%)': np.float64,
+    'Capacity Factor (%)': np.float64,
+}
+grid_ranking_fields = {
+    'Year': object,
+    'Rank': np.int64,
+    'Lat': np.float64,
+    'Lon': np.float64,
+    'Daily Power Potential (kW)': np.float64,
+    'Annual Energy Production (kWh)': np.float64,
+    'Capacity Factor (%)': np.float64,
+}
+
+# Parquet result datasets, partitioned by scenario and year, and their Arrow schemas.
+result_datasets = {
+    'top_locations': result_schema(city_ranking_fields),
+    'top_power_locations': result_schema(grid_ranking_fields),
+    'supply_curves': result_schema(supply_summary_fields()),
+    'site_allocation': result_schema(allocation_fields),
+}
+
+def annual_energy(power, hours=None):
+    """
+    Convert the power of cells into their annual energy production.
+
+    Parameters:
+    - power: Power in kilowatts (kW), possibly after transmission losses.
+    - hours: Hours integrated by a time-resolved final file, or None.
+
+    Returns:
+    - Annual energy in kWh. The power of a yearly mean final file is scaled by the
+      assumed capacity factor. The power of a time-resolved file is already the mean over
+      every time step, so it is only multiplied by the hours, matching its 'annual_energy'.
+    """
+    if hours is None:
+        return (power * (assumed_capacity_factor*24)) * days_per_year
+    return power * hours
+
+# Function to calculate power loss over distance
+def calculate_power_loss(power, distance):
+    """
+    Calculate the power loss over a given distance due to transmission losses.
+
+    Parameters:
+    - power: The initial power in kilowatts (kW).
+    - distance: The distance over which the power is transmitted (in meters).
+
+    Returns:
+    - The power after accounting for the loss over the given distance.
+    """
+    distance_km = distance / 1000
+    loss_fraction = 1 - (power_loss_per_1000km * (distance_km // 1000))
+    return power * loss_fraction
+
+def city_geometry(city_lats, city_lons, lat, lon):
+    """
+    Load the distances and transmission loss factors between the cities and the grid.
+
+    Parameters:
+    - city_lats, city_lons: City coordinates in degrees.
+    - lat, lon: 1D grid coordinates in degrees.
+
+    Returns:
+    - geometry_cache.CityGeometry with memory-mapped (city, lat, lon) cubes.
+
+    The cubes are keyed by a hash of the city coordinates, the grid and the loss rate,
+    so they are computed once and rebuilt automatically when any of them change.
+    """
+    return cached_city_geometry(
+        geometry_cache_directory, city_lats, city_lons, lat, lon,
+        loss_factor=lambda distance: calculate_power_loss(1.0, distance),
+        loss_parameters={'power_loss_per_1000km': power_loss_per_1000km},
+    )
+
+def viable_cells_file_path(scenario, year):
+    """
+    Return the file holding the sparse store of the viable cells of a scenario and year.
+    """
+    return os.path.join(scenario_directories(scenario)['final_files'], f'viable_cells_{year}.npz')
+
+def load_viable_cells(scenario, year):
+    """
+    Load the viable cells of a final file, extracting them on first use.
+
+    Parameters:
+    - scenario: The RCP scenario label.
+    - year: The year.
+
+    Returns:
+    - viable_cells.ViableCells instance.
+
+    The store is stamped with the hash of the final file, so it is extracted again
+    whenever the final file is rebuilt, whichever mode produced it. The ranking,
+    allocation and site index stages read it instead of the dense power grid.
+    """
+    final_file_path = os.path.join(scenario_directories(scenario)['final_files'], f'final_file_{year}.nc')
+    file_path = viable_cells_file_path(scenario, year)
+    signature, details = stage_signature({'final_file': final_file_path},
+                                         {'pipeline_version': pipeline_version, 'store_format_version': store_format_version})
+    if not is_up_to_date(file_path, signature):
+        with stage('viable_cells', scenario=scenario, year=year):
+            viable = ViableCells.from_final_file(final_file_path)
+            viable.save(file_path)
+        record_stamp(file_path, signature, details)
+        print(f"{len(viable)} of {viable.shape[0] * viable.shape[1]} cells are viable for RCP {scenario} {year}")
+    return ViableCells.load(file_path)
+
+def supply_curve_file_path(scenario, year):
+    """
+    Return the file holding the per-city supply curves of a scenario and year.
+    """
+    return os.path.join(scenario_directories(scenario)['final_files'], f'supply_curves_{year}.npz')
+
+def analyse_year(scenario, year, *, max_transmission_km=max_transmission_km, site_spacing_km=site_spacing_km, top_k=top_k):
+    """
+    Rank the locations of a year, reusing the stored rankings when they are up to date.
+
+    Parameters:
+    - scenario: The RCP scenario label.
+    - year: The year to analyse.
+    - max_transmission_km: Only rank cells within this distance of each city, or None for the whole domain.
+    - site_spacing_km: Minimum distance between two ranked sites of a list, or None.
+    - top_k: Number of locations ranked per city and for the whole grid.
+
+    Returns:
+    - Tuple (top_locations, top_locations_no_demand) of DataFrames for the year.
+
+    The rankings are stamped with the hash of the final file, the city demand
+    projection and the analysis parameters, so unchanged years are not re-ranked. The
+    supply curves of the cities are built in the same pass (see supply_curve_file_path).
+    """
+    directories = scenario_directories(scenario)
+    rankings_file_path = os.path.join(directories['final_files'], f'rankings_{year}.pkl')
+    inputs = {
+        'final_file': os.path.join(directories['final_files'], f'final_file_{year}.nc'),
+        'city_demand': os.path.join(population_directory, f'city_power_demand_projection_{year}.csv'),
+    }
+    parameters = {
+        'pipeline_version': pipeline_version,
+        'top_k': top_k,
+        'days_per_year': days_per_year,
+        'assumed_capacity_factor': assumed_capacity_factor,
+        'power_loss_per_1000km': power_loss_per_1000km,
+        'max_annual_output': max_annual_output,
+        'max_transmission_km': max_transmission_km,
+        'site_spacing_km': site_spacing_km,
+    }
+    signature, details = stage_signature(inputs, parameters)
+    if is_up_to_date(rankings_file_path, signature) and os.path.exists(supply_curve_file_path(scenario, year)):
+        print(f"The analysis for RCP {scenario} {year} is up to date.")
+        return pd.read_pickle(rankings_file_path)
+
+    with stage('city_ranking', scenario=scenario, year=year):
+        rankings = rank_locations(scenario, year, max_transmission_km=max_transmission_km, supply_curve_file=supply_curve_file_path(scenario, year),
+                                  site_spacing_km=site_spacing_km, top_k=top_k)
+    pd.to_pickle(rankings, rankings_file_path)
+    record_stamp(rankings_file_path, signature, details)
+    return rankings
+
+def rank_locations(scenario, year, *, max_transmission_km=max_transmission_km, supply_curve_file=None, site_spacing_km=site_spacing_km,
+                   top_k=top_k):
+    """
+    Rank the best wind farm locations for every city and for the whole grid.
+
+    Parameters:
+    - scenario: The RCP scenario label.
+    - year: The year to analyse.
+    - max_transmission_km: Only rank cells within this distance of each city, or None for the whole domain.
+    - supply_curve_file: Optional file to save the supply curve of every city to, built
+                         from the same distance-adjusted production as the ranking.
+    - site_spacing_km: Minimum distance between two sites of the same list, so that
+                       neighbouring cells of one wind resource are reported once; None
+                       ranks the cells independently.
+    - top_k: Number of locations ranked per city and for the whole grid.
+
+    Returns:
+    - Tuple (top_locations, top_locations_no_demand) of DataFrames for the year.
+    """
+    # Power and coordinates of the viable cells only
+    viable = load_viable_cells(scenario, year)
+    viable_power = viable.power
+    viable_cell_lat, viable_cell_lon = viable.lat, viable.lon
+
+    # Load city energy demand data from CSV file
+    energy_demand_df = pd.read_csv(os.path.join(population_directory, f'city_power_demand_projection_{year}.csv'))
+
+    # Typed result columns, preallocated for top_k locations per city
+    top_locations = ResultColumns(city_ranking_fields, capacity=len(energy_demand_df) * top_k)
+
+    if max_transmission_km is None:
+        # Distances and loss factors from every city to every grid cell, shared by every scenario and year
+        geometry = city_geometry(energy_demand_df['Latitude'], energy_demand_df['Longitude'], viable.grid_lat, viable.grid_lon)
+    else:
+        # Index the viable cells so each city only looks at the cells within reach
+        cell_grid = CellGrid(viable_cell_lat, viable_cell_lon)
+    city_lats = energy_demand_df['Latitude'].to_numpy(dtype=np.float64)
+    city_lons = energy_demand_df['Longitude'].to_numpy(dtype=np.float64)
+
+    supply_curves = []
+
+    # Iterate over each city
+    city_names = energy_demand_df['City'].to_numpy()
+    city_demands = energy_demand_df['Energy Demand (kWh)'].to_numpy(dtype=np.float64)
+    for city_index, (city_name, city_energy_demand_annual) in enumerate(zip(city_names, city_demands)):
+        if max_transmission_km is None:
+            # Evaluate every viable grid cell for this city at once
+            cells = slice(None)
+            distance = viable.gather(geometry.distance[city_index])
+            adjusted_daily_power = viable_power * viable.gather(geometry.loss_factor[city_index])
+        else:
+            # Evaluate the viable grid cells within the transmission distance of this city
+            cells, distance = cell_grid.within(city_lats[city_index], city_lons[city_index], max_transmission_km)
+            adjusted_daily_power = calculate_power_loss(viable_power[cells], distance)
+
+        if supply_curve_file is not None:
+            # Running total of the production of the city's cells, best cell first
+            supply_curves.append(supply_curve(annual_energy(adjusted_daily_power, viable.hours)))
+
+        # Select the top locations by adjusted power generation, at least site_spacing_km apart
+        top_cells = spaced_top_k_indices(adjusted_daily_power, viable_cell_lat[cells], viable_cell_lon[cells], top_k, site_spacing_km)
+        power = adjusted_daily_power[top_cells]
+
+        # Calculate the annual energy production for the locations
+        annual_production = annual_energy(power, viable.hours)
+
+        # Calculate demand satisfaction percentage
+        satisfaction = (annual_production / city_energy_demand_annual) * 100 if city_energy_demand_annual else 0
+
+        # Add the top locations of the city as one block of rows
+        top_locations.append(**{
+            'Year': year,
+            'City': city_name,
+            'Rank': np.arange(1, top_cells.size + 1),
+            'Lat': viable_cell_lat[cells][top_cells],
+            'Lon': viable_cell_lon[cells][top_cells],
+            'Distance_to_City (km)': distance[top_cells],
+            'Adjusted_Daily_Power (kW)': power,
+            'Annual_Energy_Production (kWh)': annual_production,
+            'City_Energy_Demand (kWh)': city_energy_demand_annual,
+            'Demand_Satisfaction (%)': satisfaction,
+            'Capacity Factor (%)': (annual_production / max_annual_output) * 100,
+        })
+
+    if supply_curve_file is not None:
+        save_supply_curves(supply_curve_file, city_names, city_demands, supply_curves)
+    print(f"The analysis for RCP {scenario} {year} has been completed.")
+
+    # Rank the grid points by annual energy production and select the top locations
+    annual_energy_potential = annual_energy(viable_power, viable.hours)
+    top_cells = spaced_top_k_indices(annual_energy_potential, viable_cell_lat, viable_cell_lon, top_k, site_spacing_km)
+    annual_production = annual_energy_potential[top_cells]
+
+    top_locations_no_demand = ResultColumns(grid_ranking_fields, capacity=top_k)
+    top_locations_no_demand.append(**{
+        'Year': year,
+        'Rank': np.arange(1, top_cells.size + 1),
+        'Lat': viable_cell_lat[top_cells],
+        'Lon': viable_cell_lon[top_cells],
+        # Power of the cells before the conversion to annual energy
+        'Daily Power Potential (kW)': viable_power[top_cells],
+        'Annual Energy Production (kWh)': annual_production,
+        'Capacity Factor (%)': (annual_production / max_annual_output) * 100,
+    })
+
+    return top_locations.to_frame(), top_locations_no_demand.to_frame()
+
+def allocation_file_path(scenario, year):
+    """
+    Return the file holding the competitive site allocation of a scenario and year.
+    """
+    return os.path.join(scenario_directories(scenario)['final_files'], f'allocation_{year}.pkl')
+
+def allocate_year(scenario, year, *, max_transmission_km=max_transmission_km, refine=False):
+    """
+    Allocate every viable cell to at most one city so that the cities meet as much demand as possible.
+
+    Parameters:
+    - scenario: The RCP scenario label.
+    - year: The year to allocate.
+    - max_transmission_km: Maximum distance between a city and its cells; allocation_radius_km when None.
+    - refine: Improve the greedy allocation with an LP relaxation (requires scipy).
+
+    Returns:
+    - DataFrame of the allocated cells of every city (see site_allocation.allocation_fields),
+      also saved at allocation_file_path.
+
+    Unlike the per-city rankings, where several cities can claim the same cell, the
+    cells are shared out between the cities of the demand projection, with the same
+    transmission loss as the rankings.
+    """
+    viable = load_viable_cells(scenario, year)
+    energy_demand_df = pd.read_csv(os.path.join(population_directory, f'city_power_demand_projection_{year}.csv'))
+
+    annual_production = annual_energy(viable.power, viable.hours)
+    radius_km = allocation_radius_km if max_transmission_km is None else max_transmission_km
+
+    with stage('site_allocation', scenario=scenario, year=year):
+        allocation = allocate_sites(
+            viable.lat, viable.lon, annual_production, energy_demand_df, radius_km,
+            loss_factor=lambda distance: calculate_power_loss(1.0, distance), year=year, refine=refine,
+        )
+    pd.to_pickle(allocation, allocation_file_path(scenario, year))
+    print(f"The site allocation for RCP {scenario} {year} has been completed.")
+    return allocation
+
+# Section 6: Saving Results
+
+def save_scenario_results(scenario, all_years_top_locations, all_years_top_locations_no_demand, years=None):
+    """
+    Save the ranked locations of one scenario as Parquet partitions and site maps.
+
+    Parameters:
+    - scenario: The RCP scenario label.
+    - all_years_top_locations: Per-city rankings for every year.
+    - all_years_top_locations_no_demand: Grid-wide rankings for every year.
+    - years: Years that were ranked, whose partitions are replaced even when they have
+             no rows. Defaults to the years present in the rankings.
+
+    The Parquet datasets under results_directory are the primary output: one
+    Scenario=.../Year=... partition per unit with a fixed schema, readable with Arrow
+    without conversion. Rerunning a scenario replaces only its own partitions. The sites
+    are also streamed to KML, GeoJSON and GeoParquet files in the scenario's code directory.
+    """
+    directories = scenario_directories(scenario)
+
+    with stage('parquet_export', scenario=scenario):
+        for name, df in (('top_locations', all_years_top_locations), ('top_power_locations', all_years_top_locations_no_demand)):
+            write_results(df, dataset_directory(results_directory, name), scenario, result_datasets[name], years)
+        print(f"Results for RCP {scenario} saved to the Parquet datasets in '{results_directory}'")
+
+    # Round all values in the DataFrame to five decimal places
+    all_years_top_locations, all_years_top_locations_no_demand = all_years_top_locations.round(5), all_years_top_locations_no_demand.round(5)
+
+    with stage('site_export', scenario=scenario):
+        # Create and save the site maps for Google Earth and GIS tools
+        export_sites(all_years_top_locations, os.path.join(directories['code'], "top_locations"), result_datasets['top_locations'])
+        export_sites(all_years_top_locations_no_demand, os.path.join(directories['code'], "top_power_locations_no_demand"), result_datasets['top_power_locations'])
+
+def export_excel(scenario, years, datasets=('top_locations', 'top_power_locations')):
+    """
+    Export the Parquet results of one scenario to its Excel workbooks.
+
+    Parameters:
+    - scenario: The RCP scenario label.
+    - years: Years to export; partitions of other years left by earlier runs are skipped.
+    - datasets: Names of the result_datasets written by the run, one workbook each.
+
+    Returns:
+    - Tuple of the workbook paths, one per result dataset.
+    """
+    directories = scenario_directories(scenario)
+    paths = []
+    with stage('excel_export', scenario=scenario):
+        for name in datasets:
+            df = read_results(dataset_directory(results_directory, name), result_datasets[name], scenario=scenario, year=list(years))
+
+            # Round all values in the DataFrame to five decimal places
+            df = df.drop(columns='Scenario').round(5)
+            path = os.path.join(directories['code'], f"RCP_{scenario}_{name}.xlsx")
+            df.to_excel(path, index=False)
+            paths.append(path)
+            print(f"Results saved to 'RCP_{scenario}_{name}.xlsx'")
+    return tuple(paths)
+
+def save_supply_summary(scenario, years):
+    """
+    Save the supply curve summary of every city and year of one scenario as Parquet partitions.
+
+    Parameters:
+    - scenario: The RCP scenario label.
+    - years: Years whose supply curves are summarised.
+
+    Returns:
+    - DataFrame of the summary, one row per city and year, with the number of best
+      cells needed to meet 50, 80 and 100% of the demand.
+    """
+    with stage('supply_curves', scenario=scenario):
+        summary = pd.concat([SupplyCurves(supply_curve_file_path(scenario, year)).summary(year) for year in years], ignore_index=True)
+        write_results(summary, dataset_directory(results_directory, 'supply_curves'), scenario, result_datasets['supply_curves'], years)
+    print(f"Supply curves for RCP {scenario} saved to the Parquet datasets in '{results_directory}'")
+    return summary
+
+def save_allocation(scenario, years):
+    """
+    Save the competitive site allocation of every year of one scenario as Parquet partitions.
+
+    Parameters:
+    - scenario: The RCP scenario label.
+    - years: Years whose allocations were computed by allocate_year.
+
+    Returns:
+    - DataFrame of the allocation of every year.
+    """
+    allocation = pd.concat([pd.read_pickle(allocation_file_path(scenario, year)) for year in years], ignore_index=True)
+    write_results(allocation, dataset_directory(results_directory, 'site_allocation'), scenario, result_datasets['site_allocation'], years)
+    print(f"Site allocation for RCP {scenario} saved to the Parquet datasets in '{results_directory}'")
+    return allocation